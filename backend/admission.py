@@ -0,0 +1,167 @@
+# Libraries
+import math, os, threading, time
+from http import HTTPStatus
+from cachetools import TTLCache
+
+# Route class of each endpoint, the others are "read"
+ROUTE_CLASSES = {
+    "api.search_posts": "search",
+    "api.save_post": "write",
+    "api.update_post": "write",
+    "api.delete_post": "write",
+    "api.create_comment": "write",
+    "api.delete_comment": "write",
+    "api.like_post": "write",
+    "api.unlike_post": "write",
+    "api.import_my_posts": "write",
+    "api.login": "auth",
+    "api.register": "auth",
+    "api.login_email": "auth",
+}
+# Endpoints never limited nor shed (scrapes and the home page)
+EXEMPT_ENDPOINTS = {"api.home", "api.get_metrics"}
+
+# Requests per second and burst of one client, per route class
+DEFAULT_LIMITS = {
+    "read": (20.0, 60),
+    "search": (2.0, 10),
+    "write": (5.0, 20),
+    "auth": (1.0, 5),
+}
+
+# "rate:burst" (e.g. "2:10"), or "0" to disable the limit
+def parse_limit(value, default):
+    if value is None or value == "":
+        return default
+    if value.strip() == "0":
+        return None
+    rate, _, burst = value.partition(":")
+    return float(rate), int(burst or math.ceil(float(rate)))
+
+def route_class(endpoint):
+    return ROUTE_CLASSES.get(endpoint, "read")
+
+# Token buckets per (route class, client). A client starts with `burst` tokens, each request
+# takes one and they come back at `rate` per second. Buckets of idle clients expire once full
+# again, so memory is bounded by the clients seen lately (and by maxsize).
+# Each gunicorn worker has its own buckets: a client gets up to `workers` times the limit.
+class RateLimiter:
+    def __init__(self, limits, maxsize=100000):
+        self.limits = limits  # route class -> (rate, burst) or None
+        ttl = max([burst / rate for rate, burst in (limit for limit in limits.values() if limit)] or [1])
+        self.buckets = TTLCache(maxsize=maxsize, ttl=ttl)  # (route class, client) -> [tokens, updated at]
+        self.lock = threading.Lock()
+
+    # Take a token. Returns 0 when the request is allowed, otherwise the seconds until it would be
+    def acquire(self, name, client):
+        limit = self.limits.get(name)
+        if not limit:
+            return 0
+        rate, burst = limit
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get((name, client))
+            if bucket is None:
+                bucket = [float(burst), now]
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            if tokens < 1:
+                return (1 - tokens) / rate
+            # Re-inserted on every request, so the entry lives until the bucket is full again
+            self.buckets[(name, client)] = [tokens - 1, now]
+            return 0
+
+# Bounds the requests running at once in this process. Past the limit new requests are
+# rejected instead of queueing behind slow MongoDB work, so the ones admitted keep their
+# latency. Route classes can have a lower limit of their own (searches scan the posts).
+# Under gunicorn (gthread) at most GUNICORN_THREADS requests run at once and the others wait
+# in gunicorn's queue, out of sight: the limits must stay below the thread count, so the
+# threads left answer the queued requests with 503 right away instead of making them wait.
+class LoadShedder:
+    def __init__(self, max_in_flight=3, class_limits=None):
+        self.max_in_flight = max_in_flight
+        self.class_limits = class_limits or {}
+        self.in_flight = {}
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def enter(self, name):
+        with self.lock:
+            current = self.in_flight.get(name, 0)
+            limit = self.class_limits.get(name)
+            if self.total >= self.max_in_flight or (limit is not None and current >= limit):
+                return False
+            self.in_flight[name] = current + 1
+            self.total += 1
+            return True
+
+    def leave(self, name):
+        with self.lock:
+            self.in_flight[name] -= 1
+            self.total -= 1
+
+    def stats(self):
+        with self.lock:
+            return {"inFlight": dict(self.in_flight), "total": self.total, "maxInFlight": self.max_in_flight, "classLimits": dict(self.class_limits)}
+
+# Client of a request: the JWT identity when a valid token is sent, the address otherwise.
+# Behind a reverse proxy remote_addr is the proxy, wrap the app in werkzeug's ProxyFix there
+def client_key():
+    from flask import request
+    from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+    try:
+        if verify_jwt_in_request(optional=True):
+            return f"user:{get_jwt_identity()}"
+    except Exception:
+        # Expired or invalid tokens are limited by address, the endpoint rejects them anyway
+        pass
+    return f"ip:{request.remote_addr}"
+
+# Rate limit every request (429) and shed load (503) before the endpoint runs.
+# Rejections are counted in the metrics when given
+def install(app, limiter, shedder, metrics=None):
+    from flask import request, g
+
+    @app.before_request
+    def admit():
+        if request.method == "OPTIONS" or request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+        name = route_class(request.endpoint)
+
+        if limiter is not None:
+            wait = limiter.acquire(name, client_key())
+            if wait:
+                if metrics is not None:
+                    metrics.rejected(name, "rate_limited")
+                return {"error": "Too many requests, slow down"}, HTTPStatus.TOO_MANY_REQUESTS, {"Retry-After": str(math.ceil(wait))}
+
+        if shedder is not None:
+            if not shedder.enter(name):
+                if metrics is not None:
+                    metrics.rejected(name, "overloaded")
+                return {"error": "Server busy, try again shortly"}, HTTPStatus.SERVICE_UNAVAILABLE, {"Retry-After": "1"}
+            g.admitted_class = name
+        return None
+
+    # teardown runs even when the endpoint raised, so the slot is always given back
+    @app.teardown_request
+    def release(error=None):
+        name = g.pop("admitted_class", None)
+        if name is not None:
+            shedder.leave(name)
+
+def create_rate_limiter():
+    if os.getenv("RATE_LIMIT_ENABLED", "True").lower() != "true":
+        return None
+    return RateLimiter({
+        name: parse_limit(os.getenv(f"RATE_LIMIT_{name.upper()}"), default)
+        for name, default in DEFAULT_LIMITS.items()
+    })
+
+# Defaults leave one request thread free, and half of them at most to searches
+def create_load_shedder():
+    threads = int(os.getenv("GUNICORN_THREADS", 4))
+    max_in_flight = int(os.getenv("MAX_IN_FLIGHT", max(1, threads - 1)))
+    if max_in_flight <= 0:
+        return None
+    max_searches = int(os.getenv("MAX_IN_FLIGHT_SEARCH", max(1, threads // 2)))
+    return LoadShedder(max_in_flight, {"search": max_searches} if max_searches > 0 else {})
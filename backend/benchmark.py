@@ -0,0 +1,442 @@
+# Endpoint benchmark: seeds a database with a reproducible dataset, drives every
+# route of server.py through the Flask test client at a fixed concurrency and
+# prints latency percentiles, throughput, Mongo round trips per request and the
+# peak RSS as JSON, so runs can be compared between commits.
+#
+# Usage:
+#   python benchmark.py --mongo-uri mongodb://localhost:27017 [--output run.json]
+#   python benchmark.py --in-process --view full   (mongomock stand-in, pip install mongomock)
+#   python benchmark.py ... --compare previous.json
+#
+# mongomock has no command monitoring and lacks some operators ($substrCP, used by the
+# summary view), so mongod is the reference and the stand-in is for quick local runs.
+# The benchmark only ever drops the database named by --db (postly_benchmark by default).
+import argparse, datetime, json, math, os, random, subprocess, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARK_PASSWORD = "benchmark-password"
+
+##############################################
+################ Measurements ################
+##############################################
+
+# Counts the Mongo commands started by each thread (registered before the client is created)
+class CommandCounter:
+    def __init__(self):
+        self.local = threading.local()
+        self.enabled = False
+
+    def started(self, event):
+        self.local.count = getattr(self.local, "count", 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def take(self):
+        count = getattr(self.local, "count", 0)
+        self.local.count = 0
+        return count
+
+# Samples the RSS of the process in the background and keeps the peak
+class RssSampler:
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def rss(self):
+        import psutil
+        return psutil.Process().memory_info().rss
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, self.rss())
+            self.stopped.wait(self.interval)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, self.rss())
+        return self.peak
+
+# Nearest-rank percentile: the smallest value with at least `fraction` of the values at or below it.
+# fraction * n is rounded first so float noise (0.07 * 100 = 7.000000000000001) can't move the rank
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(round(fraction * len(ordered), 9))
+    return ordered[min(len(ordered) - 1, max(0, rank - 1))]
+
+##############################################
+################## Dataset ###################
+##############################################
+
+def make_words(rng, count=600):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(count)]
+
+def sentence(rng, words, low, high):
+    return " ".join(rng.choice(words) for _ in range(rng.randint(low, high)))
+
+def timestamp(rng, days=365):
+    moment = datetime.datetime.now(datetime.UTC) - datetime.timedelta(seconds=rng.randint(0, days * 86400))
+    return moment.isoformat()
+
+def insert_chunks(collection, documents, chunk_size=1000):
+    for start in range(0, len(documents), chunk_size):
+        collection.insert_many(documents[start:start + chunk_size], ordered=False)
+
+# Seed users, posts, comments and likes. The same seed always produces the same dataset
+def seed(db, server, users=50, posts=500, comments=2000, likes=2000, seed_value=42):
+    from bson.objectid import ObjectId
+    from werkzeug.security import generate_password_hash
+    from users import user_data
+    from posts import calculate_read_time
+    from slugs import create_slug
+    from counters import rebuild_counts, rebuild_author_stats
+
+    rng = random.Random(seed_value)
+    words = make_words(rng)
+    password_hash = generate_password_hash(BENCHMARK_PASSWORD, method=server.password_hasher.method)
+
+    user_docs = []
+    for i in range(users):
+        user_docs.append({
+            "userId": str(ObjectId()),
+            "name": f"Benchmark User {i}",
+            "email": f"user{i}@benchmark.local",
+            "password": password_hash,
+            "profilePicture": None,
+            "lastLogin": timestamp(rng)
+        })
+    insert_chunks(db.users, user_docs)
+
+    post_docs = []
+    for i in range(posts):
+        author = rng.choice(user_docs)
+        title = sentence(rng, words, 3, 8)
+        content = sentence(rng, words, 100, 800)
+        created_at = timestamp(rng)
+        post_docs.append({
+            "_id": ObjectId(),
+            "title": title,
+            "content": content,
+            "author": user_data(author),
+            "slug": f"{create_slug(title)}-{i}",
+            "createdAt": created_at,
+            "updatedAt": created_at,
+            "status": "published" if rng.random() < 0.9 else "draft",
+            "readTime": calculate_read_time(content),
+            "views": rng.randint(0, 5000),
+            "likes": 0,
+            "commentCount": 0,
+            "coverImage": None
+        })
+
+    comment_docs = []
+    for _ in range(comments):
+        post = rng.choice(post_docs)
+        author = rng.choice(user_docs)
+        comment_docs.append({
+            "_id": ObjectId(),
+            "postId": str(post["_id"]),
+            "content": sentence(rng, words, 5, 40),
+            "author": {"userId": author["userId"], "name": author["name"], "profilePicture": None},
+            "createdAt": timestamp(rng),
+            "likes": 0
+        })
+        post["commentCount"] += 1
+
+    like_pairs = set()
+    for _ in range(min(likes, users * posts)):
+        while True:
+            pair = (rng.randrange(posts), rng.randrange(users))
+            if pair not in like_pairs:
+                like_pairs.add(pair)
+                break
+    like_docs = []
+    for post_index, user_index in like_pairs:
+        post = post_docs[post_index]
+        post["likes"] += 1
+        like_docs.append({"postId": str(post["_id"]), "userId": user_docs[user_index]["userId"], "createdAt": timestamp(rng)})
+
+    insert_chunks(db.posts, post_docs)
+    insert_chunks(db.comments, comment_docs)
+    insert_chunks(db.post_likes, like_docs)
+    # Listing totals and author stats read the counters, as in a deployment (see counters.ensure_counts)
+    rebuild_author_stats(db)
+    rebuild_counts(db)
+
+    return {
+        "users": user_docs,
+        "posts": [post for post in post_docs if post["status"] == "published"],
+        "comments": comment_docs,
+        "words": words,
+        "rng": rng
+    }
+
+##############################################
+################# Scenarios ##################
+##############################################
+
+# Each scenario returns (method, path, json body, user) for the i-th request.
+# Setup functions create the documents destructive scenarios consume, outside the timing.
+def build_scenarios(data, db, view="summary"):
+    from bson.objectid import ObjectId
+    rng = random.Random(7)
+    users, posts, words = data["users"], data["posts"], data["words"]
+    any_post = lambda: rng.choice(posts)
+    any_user = lambda: rng.choice(users)
+    users_by_id = {user["userId"]: user for user in users}
+
+    def targets(count, kind):
+        # Posts and comments that the delete scenarios remove
+        user = users[0]
+        created = []
+        for i in range(count):
+            post_id = ObjectId()
+            created_at = datetime.datetime.now(datetime.UTC).isoformat()
+            db.posts.insert_one({
+                "_id": post_id, "title": f"target {kind} {i}", "content": "target", "author": {"userId": user["userId"], "name": user["name"]},
+                "slug": f"target-{kind}-{post_id}", "createdAt": created_at, "updatedAt": created_at, "status": "published",
+                "readTime": 1, "views": 0, "likes": 0, "commentCount": 1 if kind == "comment" else 0, "coverImage": None
+            })
+            comment_id = ObjectId()
+            if kind == "comment":
+                db.comments.insert_one({"_id": comment_id, "postId": str(post_id), "content": "target", "author": {"userId": user["userId"], "name": user["name"]}, "createdAt": created_at, "likes": 0})
+            created.append((str(post_id), str(comment_id), user))
+        return created
+
+    scenarios = [
+        ("GET /", lambda i: ("GET", "/", None, None)),
+        ("POST /api/auth/register", lambda i: ("POST", "/api/auth/register", {"email": f"new{i}-{rng.random()}@benchmark.local", "password": BENCHMARK_PASSWORD, "name": "New"}, None)),
+        ("POST /api/auth/login/email", lambda i: ("POST", "/api/auth/login/email", {"email": any_user()["email"], "password": BENCHMARK_PASSWORD}, None)),
+        ("GET /api/auth/check", lambda i: ("GET", "/api/auth/check", None, any_user())),
+        ("GET /api/posts", lambda i: ("GET", f"/api/posts?page={rng.randint(1, 5)}&view={view}", None, None)),
+        ("GET /api/posts (deep page)", lambda i: ("GET", f"/api/posts?page={rng.randint(20, 40)}&view={view}", None, None)),
+        ("GET /api/admission/stats", lambda i: ("GET", "/api/admission/stats", None, None)),
+        ("GET /api/posts/batch (ids)", lambda i: ("GET", "/api/posts/batch?ids=" + ",".join(str(any_post()["_id"]) for _ in range(10)) + f"&view={view}", None, None)),
+        ("GET /api/posts/batch (slugs)", lambda i: ("GET", "/api/posts/batch?slugs=" + ",".join(any_post()["slug"] for _ in range(10)) + f"&view={view}", None, None)),
+        ("GET /api/posts/trending", lambda i: ("GET", f"/api/posts/trending?view={view}", None, None)),
+        ("GET /api/posts/<id>", lambda i: ("GET", f"/api/posts/{any_post()['_id']}", None, None)),
+        ("GET /api/posts/slug/<slug>", lambda i: ("GET", f"/api/posts/slug/{any_post()['slug']}", None, None)),
+        ("POST /api/posts", lambda i: ("POST", "/api/posts", {"title": sentence(rng, words, 3, 8), "content": sentence(rng, words, 100, 400)}, any_user())),
+        ("PUT /api/posts/<id>", lambda i: (lambda post: ("PUT", f"/api/posts/{post['_id']}", {"content": sentence(rng, words, 100, 400)}, users_by_id[post["author"]["userId"]]))(any_post())),
+        ("GET /api/posts/<post_id>/comments", lambda i: ("GET", f"/api/posts/{any_post()['_id']}/comments", None, None)),
+        ("POST /api/posts/<post_id>/comments", lambda i: ("POST", f"/api/posts/{any_post()['_id']}/comments", {"content": sentence(rng, words, 5, 40)}, any_user())),
+        ("POST /api/posts/<post_id>/like", lambda i: ("POST", f"/api/posts/{any_post()['_id']}/like", None, any_user())),
+        ("DELETE /api/posts/<post_id>/like", lambda i: ("DELETE", f"/api/posts/{any_post()['_id']}/like", None, any_user())),
+        ("GET /api/posts/<post_id>/like", lambda i: ("GET", f"/api/posts/{any_post()['_id']}/like", None, any_user())),
+        ("GET /api/posts/likes", lambda i: ("GET", "/api/posts/likes?ids=" + ",".join(str(any_post()["_id"]) for _ in range(10)), None, any_user())),
+        ("GET /api/posts/search", lambda i: ("GET", f"/api/posts/search?q={rng.choice(words)[:4]}&view={view}", None, None)),
+        ("GET /api/users/<user_id>/stats", lambda i: ("GET", f"/api/users/{any_user()['userId']}/stats", None, None)),
+        ("GET /api/users/<user_id>/posts", lambda i: ("GET", f"/api/users/{any_user()['userId']}/posts?view={view}", None, None)),
+        ("GET /api/users/me/posts", lambda i: ("GET", f"/api/users/me/posts?view={view}", None, any_user())),
+        ("GET /api/users/me/posts/export", lambda i: ("GET", "/api/users/me/posts/export", None, any_user())),
+        ("POST /api/posts/import", lambda i: ("POST", "/api/posts/import", "".join(json.dumps({"title": sentence(rng, words, 3, 8), "content": sentence(rng, words, 100, 400)}) + "\n" for _ in range(20)).encode(), any_user())),
+        ("GET /api/cache/stats", lambda i: ("GET", "/api/cache/stats", None, None)),
+        ("GET /api/auth/hashing/stats", lambda i: ("GET", "/api/auth/hashing/stats", None, None)),
+        ("GET /metrics", lambda i: ("GET", "/metrics", None, None)),
+    ]
+
+    # Destructive scenarios get their own targets
+    destructive = [
+        ("DELETE /api/posts/<id>", "post", lambda target: ("DELETE", f"/api/posts/{target[0]}", None, target[2])),
+        ("DELETE /api/posts/<post_id>/comments/<comment_id>", "comment", lambda target: ("DELETE", f"/api/posts/{target[0]}/comments/{target[1]}", None, target[2])),
+    ]
+    return scenarios, destructive, targets
+
+# Routes that cannot be driven without external services
+SKIPPED_ROUTES = {
+    "POST /api/auth/login": "needs a Google ID token"
+}
+
+##############################################
+################### Runner ###################
+##############################################
+
+def run_scenario(server, tokens, counter, build_request, requests, concurrency):
+    local = threading.local()
+
+    def call(i):
+        if not hasattr(local, "client"):
+            local.client = server.app.test_client()
+        method, path, body, user = build_request(i)
+        headers = {"Authorization": f"Bearer {tokens[user['userId']]}"} if user else {}
+        counter.take()
+        start = time.perf_counter()
+        # Bytes are sent as they are (NDJSON), anything else as JSON
+        if isinstance(body, bytes):
+            response = local.client.open(path, method=method, data=body, headers=headers, content_type="application/x-ndjson")
+        else:
+            response = local.client.open(path, method=method, json=body, headers=headers)
+        # Streamed bodies are produced while they are read
+        response.get_data()
+        elapsed = time.perf_counter() - start
+        return elapsed, response.status_code, counter.take()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(requests)))
+    duration = time.perf_counter() - start
+
+    latencies = [elapsed * 1000 for elapsed, _, _ in results]
+    statuses = {}
+    for _, status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": requests,
+        # Every scenario expects a 2xx answer
+        "errors": sum(count for status, count in statuses.items() if int(status) >= 400),
+        "statuses": statuses,
+        "p50Ms": round(percentile(latencies, 0.50), 3),
+        "p95Ms": round(percentile(latencies, 0.95), 3),
+        "p99Ms": round(percentile(latencies, 0.99), 3),
+        "meanMs": round(sum(latencies) / len(latencies), 3),
+        "throughputRps": round(requests / duration, 1),
+        "mongoCommandsPerRequest": round(sum(commands for _, _, commands in results) / requests, 2) if counter.enabled else None
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+# Relative change of the main numbers against a previous run
+def compare(current, previous):
+    changes = {}
+    for route, result in current["routes"].items():
+        before = previous.get("routes", {}).get(route)
+        if not before:
+            continue
+        changes[route] = {
+            metric: round((result[metric] - before[metric]) / before[metric] * 100, 1) if before.get(metric) else None
+            for metric in ("p50Ms", "p95Ms", "p99Ms", "throughputRps", "mongoCommandsPerRequest")
+            if result.get(metric) is not None and before.get(metric) is not None
+        }
+    return changes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Postly API endpoints")
+    parser.add_argument("--mongo-uri", help="MongoDB to seed (e.g. mongodb://localhost:27017)")
+    parser.add_argument("--in-process", action="store_true", help="use mongomock instead of a real mongod")
+    parser.add_argument("--db", default="postly_benchmark", help="database to (re)create")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--comments", type=int, default=2000)
+    parser.add_argument("--likes", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--view", default="summary", choices=["summary", "full"], help="view of the listing routes")
+    parser.add_argument("--route", action="append", help="only run routes containing this text (repeatable)")
+    parser.add_argument("--admission", action="store_true", help="keep the rate limits and load shedding on")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="previous JSON report to compare with")
+    args = parser.parse_args()
+
+    if not args.mongo_uri and not args.in_process:
+        parser.error("pass --mongo-uri or --in-process")
+
+    # Configure the app before it is imported
+    os.environ["DB_NAME"] = args.db
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+    os.environ["ENSURE_INDEXES"] = "False"
+    # Every scenario comes from a few clients, so rate limits and shedding would turn
+    # most requests into 429/503. They are measured only when asked for
+    if not args.admission:
+        os.environ["RATE_LIMIT_ENABLED"] = "False"
+        os.environ["MAX_IN_FLIGHT"] = "0"
+
+    counter = CommandCounter()
+    if args.in_process:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("--in-process needs mongomock (pip install mongomock)")
+        import pymongo, mongomock.collection
+        pymongo.MongoClient = mongomock.MongoClient
+        # pymongo 4.11 passes sort= to bulk updates, which mongomock doesn't know
+        add_update = mongomock.collection.BulkOperationBuilder.add_update
+        mongomock.collection.BulkOperationBuilder.add_update = lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs)
+    else:
+        os.environ["CONNECTION_STRING"] = args.mongo_uri
+        from pymongo import monitoring
+        monitoring.register(counter)
+        counter.enabled = True
+
+    import server
+    from indexes import ensure_indexes
+    from flask_jwt_extended import create_access_token
+    db = server.db
+
+    db.get().client.drop_database(args.db)
+    ensure_indexes(db)
+    seed_start = time.perf_counter()
+    data = seed(db, server, args.users, args.posts, args.comments, args.likes, args.seed)
+    seed_seconds = time.perf_counter() - seed_start
+
+    with server.app.app_context():
+        tokens = {user["userId"]: create_access_token(identity=user["userId"]) for user in data["users"]}
+
+    scenarios, destructive, targets = build_scenarios(data, db, args.view)
+    selected = lambda name: not args.route or any(text in name for text in args.route)
+
+    sampler = RssSampler()
+    sampler.start()
+    routes = {}
+    for name, build_request in scenarios:
+        if selected(name):
+            routes[name] = run_scenario(server, tokens, counter, build_request, args.requests, args.concurrency)
+            print(f"{name}: p50 {routes[name]['p50Ms']} ms, p95 {routes[name]['p95Ms']} ms", file=sys.stderr)
+    for name, kind, build_request in destructive:
+        if selected(name):
+            created = targets(args.requests, kind)
+            routes[name] = run_scenario(server, tokens, counter, lambda i: build_request(created[i]), args.requests, args.concurrency)
+            print(f"{name}: p50 {routes[name]['p50Ms']} ms, p95 {routes[name]['p95Ms']} ms", file=sys.stderr)
+    peak_rss = sampler.stop()
+
+    # Routes of the app that no scenario covers
+    covered = {name.split(" (")[0] for name, _ in scenarios} | {name for name, _, _ in destructive}
+    uncovered = sorted(
+        f"{method} {rule.rule}"
+        for rule in server.app.url_map.iter_rules() if rule.endpoint != "static"
+        for method in rule.methods - {"HEAD", "OPTIONS"}
+        if f"{method} {rule.rule}" not in covered and f"{method} {rule.rule}" not in SKIPPED_ROUTES
+    )
+
+    report = {
+        "commit": git_commit(),
+        "createdAt": datetime.datetime.now(datetime.UTC).isoformat(),
+        "backend": "mongomock" if args.in_process else "mongod",
+        "dataset": {"users": args.users, "posts": args.posts, "comments": args.comments, "likes": args.likes, "seed": args.seed, "seedSeconds": round(seed_seconds, 2)},
+        "requestsPerRoute": args.requests,
+        "concurrency": args.concurrency,
+        "view": args.view,
+        "peakRssMb": round(peak_rss / (1024 * 1024), 1),
+        "routes": routes,
+        "skipped": SKIPPED_ROUTES,
+        "uncovered": uncovered
+    }
+    if args.compare:
+        with open(args.compare) as previous:
+            report["comparedWith"] = args.compare
+            report["changePercent"] = compare(report, json.load(previous))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Libraries
+import os, threading, time
+from cachetools import TTLCache
+
+# _id of the document of the cache_versions collection shared by the processes
+VERSION_KEY = "responses"
+
+# LRU + TTL cache for read endpoint responses. Every entry is tagged with the
+# resources it depends on (e.g. "post:<id>", "feed") so writes can invalidate
+# exactly the entries they make stale.
+# Each gunicorn worker has its own cache: with a database, every invalidation also bumps a
+# version in MongoDB and the other workers drop their entries when they see it change. They
+# check at most every `check_interval` seconds, which bounds how long they serve stale copies.
+class ResponseCache:
+    def __init__(self, maxsize=1024, ttl=30, db=None, check_interval=1.0):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.tags = {}  # tag -> set of keys
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.db = db
+        self.check_interval = check_interval
+        self.version = None
+        self.checked_at = 0
+
+    # Drop every entry when another process invalidated since the last check
+    def sync(self):
+        if self.db is None:
+            return
+        with self.lock:
+            now = time.monotonic()
+            if now - self.checked_at < self.check_interval:
+                return
+            self.checked_at = now
+        document = self.db.cache_versions.find_one({"_id": VERSION_KEY})
+        version = document["version"] if document else 0
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.tags.clear()
+                self.version = version
+
+    # Keys are tuples whose first item names the endpoint, used to group the counters
+    def count(self, key, hit):
+        counters = self.hits if hit else self.misses
+        counters[key[0]] = counters.get(key[0], 0) + 1
+
+    # Cached value (a shallow copy) or None
+    def get(self, key):
+        self.sync()
+        with self.lock:
+            value = self.entries.get(key)
+            self.count(key, value is not None)
+            return None if value is None else value.copy()
+
+    # Increment a counter field of a cached document in place and return a copy of it
+    def incr(self, key, field, amount=1):
+        self.sync()
+        with self.lock:
+            value = self.entries.get(key)
+            self.count(key, value is not None)
+            if value is None:
+                return None
+            value[field] = value.get(field, 0) + amount
+            return value.copy()
+
+    def set(self, key, value, tags=()):
+        with self.lock:
+            self.entries[key] = value.copy()
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            # Forget keys that expired or were evicted on their own
+            if sum(len(keys) for keys in self.tags.values()) > 4 * self.entries.maxsize:
+                self.tags = {tag: {key for key in keys if key in self.entries} for tag, keys in self.tags.items()}
+                self.tags = {tag: keys for tag, keys in self.tags.items() if keys}
+
+    # Drop every entry tagged with any of the given tags, here and (see sync) in the other processes
+    def invalidate(self, *tags):
+        with self.lock:
+            for tag in tags:
+                for key in self.tags.pop(tag, ()):
+                    self.entries.pop(key, None)
+        if self.db is None:
+            return
+        from pymongo import ReturnDocument
+        document = self.db.cache_versions.find_one_and_update(
+            {"_id": VERSION_KEY}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        with self.lock:
+            # Our own bump. A bigger jump means other processes invalidated too: left to sync
+            if self.version is not None and document["version"] == self.version + 1:
+                self.version = document["version"]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+
+    def stats(self):
+        with self.lock:
+            hits = sum(self.hits.values())
+            misses = sum(self.misses.values())
+            return {
+                "size": self.entries.currsize,
+                "maxSize": self.entries.maxsize,
+                "ttl": self.entries.ttl,
+                "checkInterval": self.check_interval if self.db is not None else None,
+                "hits": hits,
+                "misses": misses,
+                "hitRate": round(hits / (hits + misses), 4) if hits + misses else 0,
+                "endpoints": {
+                    name: {"hits": self.hits.get(name, 0), "misses": self.misses.get(name, 0)}
+                    for name in sorted(set(self.hits) | set(self.misses))
+                }
+            }
+
+# Tags shared by the endpoints
+FEED = "feed"
+
+def post_tag(post_id):
+    return f"post:{post_id}"
+
+def comments_tag(post_id):
+    return f"comments:{post_id}"
+
+# Shared between the gunicorn workers through the database (RESPONSE_CACHE_CHECK_INTERVAL=0
+# checks on every read)
+def create_response_cache():
+    from config import db
+    return ResponseCache(
+        maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", 1024)),
+        ttl=float(os.getenv("RESPONSE_CACHE_TTL", 30)),
+        db=db,
+        check_interval=float(os.getenv("RESPONSE_CACHE_CHECK_INTERVAL", 1))
+    )
+
+response_cache = create_response_cache()
+
+# Only the first pages of a feed are cached
+CACHED_PAGES = int(os.getenv("RESPONSE_CACHE_PAGES", 3))
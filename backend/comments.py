@@ -0,0 +1,90 @@
+# Libraries
+import sys, datetime
+from bson.objectid import ObjectId
+
+# Posts migrated per batch
+MIGRATION_BATCH_SIZE = 200
+
+# Build a comment document for the comments collection
+def comment_document(post_id, content, user_data):
+    return {
+        "_id": ObjectId(),
+        "postId": post_id,
+        "content": content,
+        "author": {
+            "userId": user_data["userId"],
+            "name": user_data["name"],
+            "profilePicture": user_data.get("profilePicture")
+        },
+        "createdAt": datetime.datetime.now(datetime.UTC).isoformat(),
+        "likes": 0
+    }
+
+# Insert comments ignoring the ones already copied by a previous run
+def insert_comments(db, documents):
+    from pymongo.errors import BulkWriteError
+    if not documents:
+        return 0
+    try:
+        return len(db.comments.insert_many(documents, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        duplicates = [error for error in e.details["writeErrors"] if error["code"] == 11000]
+        if len(duplicates) != len(e.details["writeErrors"]):
+            raise
+        return e.details["nInserted"]
+
+# Copy a batch of posts' embedded comments into the collection, then drop the arrays
+def migrate_batch(db, posts):
+    from pymongo import UpdateOne
+    documents = []
+    for post in posts:
+        post_id = str(post["_id"])
+        for comment in post.get("comments", []):
+            document = dict(comment, postId=post_id)
+            document["_id"] = ObjectId(comment["_id"]) if ObjectId.is_valid(comment["_id"]) else ObjectId()
+            documents.append(document)
+    inserted = insert_comments(db, documents)
+
+    # Count from the collection, so comments created while migrating are included
+    post_ids = [str(post["_id"]) for post in posts]
+    counts = {
+        row["_id"]: row["count"]
+        for row in db.comments.aggregate([
+            {"$match": {"postId": {"$in": post_ids}}},
+            {"$group": {"_id": "$postId", "count": {"$sum": 1}}}
+        ])
+    }
+    db.posts.bulk_write([
+        UpdateOne({"_id": post["_id"]}, {"$set": {"commentCount": counts.get(str(post["_id"]), 0)}, "$unset": {"comments": ""}})
+        for post in posts
+    ], ordered=False)
+    return inserted
+
+# Move every embedded comments array into the comments collection.
+# Safe to run again if it is interrupted: copied comments keep their _id.
+def migrate_embedded_comments(db, batch_size=MIGRATION_BATCH_SIZE):
+    migrated_posts = migrated_comments = 0
+    while True:
+        posts = list(db.posts.find({"comments": {"$exists": True}}, {"comments": 1}).limit(batch_size))
+        if not posts:
+            break
+        migrated_comments += migrate_batch(db, posts)
+        migrated_posts += len(posts)
+        print(f"Migrated {migrated_posts} posts, {migrated_comments} comments")
+
+    # Posts created without comments before the migration
+    db.posts.update_many({"commentCount": {"$exists": False}}, {"$set": {"commentCount": 0}})
+    return migrated_posts, migrated_comments
+
+# Usage: python comments.py migrate [batch size]
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python comments.py migrate [batch size]")
+        sys.exit(1)
+
+    from config import db
+    from indexes import ensure_indexes
+    ensure_indexes(db)
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else MIGRATION_BATCH_SIZE
+    posts, comments = migrate_embedded_comments(db, batch_size)
+    print(f"Done: {comments} comments moved out of {posts} posts")
@@ -0,0 +1,55 @@
+# Libraries
+import gzip, os
+
+# brotli compresses JSON better than gzip, responses fall back to gzip without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Media types worth compressing (images from Pexels are never served by the API)
+COMPRESSIBLE_TYPES = {"application/json", "text/html", "text/plain"}
+
+# Encoding of the response among the ones the client accepts: br, then gzip, else None
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings["br"] > 0:
+        return "br"
+    if accept_encodings["gzip"] > 0:
+        return "gzip"
+    return None
+
+# Compress the responses of at least COMPRESS_MIN_SIZE bytes with brotli or gzip, as the client
+# accepts. Streamed responses (NDJSON export) are left alone. The ETag gets the encoding as a
+# suffix, since the compressed body is another representation. 304s are not compressed: they
+# carry the suffixed tag the client sent back (see conditional.py)
+def install(app):
+    from flask import request
+    min_size = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    gzip_level = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+    brotli_quality = int(os.getenv("COMPRESS_BROTLI_QUALITY", 4))
+
+    @app.after_request
+    def compress(response):
+        if (response.status_code < 200 or response.status_code >= 300 or response.direct_passthrough or
+                response.is_streamed or "Content-Encoding" in response.headers or
+                response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        # The body depends on Accept-Encoding from here on, for every client
+        response.vary.add("Accept-Encoding")
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+        if encoding == "br":
+            response.set_data(brotli.compress(data, quality=brotli_quality))
+        else:
+            response.set_data(gzip.compress(data, compresslevel=gzip_level))
+        response.headers["Content-Encoding"] = encoding
+
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
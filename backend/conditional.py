@@ -0,0 +1,75 @@
+# Libraries
+import datetime, hashlib
+from http import HTTPStatus
+from flask import request, jsonify, current_app
+
+# Suffixes given to the ETag of a compressed body (see compression.py), accepted back in If-None-Match
+ENCODING_SUFFIXES = ("", "-gzip", "-br")
+
+# ETag of a response listing posts: changes when a post is edited (updatedAt), liked or
+# commented, gets its derived fields (wordCount, see content.py) and when the posts of the
+# list change. Views are left out, every read counts one, so a client revalidating a post
+# would never get a 304: two bodies with the same ETag can differ in their views, which is
+# why it is sent as a weak ETag.
+# None when the posts are projected without updatedAt (?fields=), edits couldn't be seen
+def posts_etag(posts, *extra):
+    digest = hashlib.sha1()
+    for value in extra:
+        digest.update(f"{value}\n".encode())
+    for post in posts:
+        if "updatedAt" not in post:
+            return None
+        digest.update(f"{post.get('_id')}:{post['updatedAt']}:{post.get('likes')}:{post.get('commentCount')}:{post.get('wordCount')}\n".encode())
+    return digest.hexdigest()[:32]
+
+# Most recent updatedAt of the posts, to the second (the precision of HTTP dates)
+def last_modified(posts):
+    latest = None
+    for post in posts:
+        try:
+            updated_at = datetime.datetime.fromisoformat(post["updatedAt"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=datetime.UTC)
+        latest = updated_at if latest is None or updated_at > latest else latest
+    return latest.replace(microsecond=0) if latest else None
+
+# The tag of the client's copy when it is current, with the encoding suffix it was sent with,
+# None otherwise. If-None-Match wins over If-Modified-Since (RFC 9110, weak comparison).
+# Likes and comments don't move updatedAt, so only the ETag sees them
+def current_etag(etag, modified):
+    if request.if_none_match:
+        if etag is None:
+            return None
+        if request.if_none_match.star_tag:
+            return etag
+        for suffix in ENCODING_SUFFIXES:
+            if request.if_none_match.contains_weak(etag + suffix):
+                return etag + suffix
+        return None
+    if request.if_modified_since and modified is not None and modified <= request.if_modified_since:
+        return etag or ""
+    return None
+
+# JSON response of posts with ETag and Last-Modified, or an empty 304 when the client's
+# copy is current: the body isn't serialized then. `extra` are the other values of the
+# body that change the ETag (pagination totals, ...). Lists are sent without Last-Modified
+# (dated=False): a post leaving the list doesn't make the newest updatedAt any newer
+def conditional_json(body, posts, extra=(), dated=True):
+    etag = posts_etag(posts, *extra)
+    modified = last_modified(posts) if dated else None
+    current = current_etag(etag, modified)
+    if current is not None:
+        # The 304 carries the tag the client has, compressed bodies' included (see compression.py)
+        response, status = current_app.response_class(), HTTPStatus.NOT_MODIFIED
+        etag = current or etag
+    else:
+        response, status = jsonify(body), HTTPStatus.OK
+    if etag:
+        response.set_etag(etag, weak=True)
+    if modified is not None:
+        response.last_modified = modified
+    # Cached copies are revalidated before they are used
+    response.headers["Cache-Control"] = "no-cache"
+    return response, status
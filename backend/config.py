@@ -1,9 +1,67 @@
-import pymongo, certifi, os
+import os, threading
 from dotenv import load_dotenv
 load_dotenv()
 
-client = pymongo.MongoClient(
-    os.getenv("CONNECTION_STRING"), 
-    tlsCAFile=certifi.where()
-)
-db = client.get_database(os.getenv("DB_NAME"))
\ No newline at end of file
+# Connection pool settings, per process (each gunicorn worker has its own pool)
+def client_options():
+    return {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", 10)),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000)),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+        "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30000)),
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000))
+    }
+
+def create_client():
+    # Imported here so importing config stays cheap
+    import pymongo, certifi
+    from metrics import metrics, command_listener
+    return pymongo.MongoClient(
+        os.getenv("CONNECTION_STRING"), 
+        tlsCAFile=certifi.where(),
+        # Every command is timed and attributed to the request that sent it
+        event_listeners=[command_listener(metrics)],
+        **client_options()
+    )
+
+# Handle to the database used by the whole app. The client is created on first use
+# and belongs to the process that created it: a forked worker gets its own client
+class DatabaseHandle:
+    def __init__(self):
+        self.client = None
+        self.database = None
+        self.pid = None
+        # Request threads and background workers can make the first query at the same time
+        self.lock = threading.Lock()
+
+    # Create a new client for this process. A client inherited from the parent
+    # process is dropped without closing it, its sockets belong to the parent
+    def connect(self):
+        self.client = create_client()
+        self.database = self.client.get_database(os.getenv("DB_NAME"))
+        self.pid = os.getpid()
+
+    def get(self):
+        if self.database is None or self.pid != os.getpid():
+            with self.lock:
+                if self.database is None or self.pid != os.getpid():
+                    self.connect()
+        return self.database
+
+    def close(self):
+        if self.client:
+            self.client.close()
+        self.client = None
+        self.database = None
+        self.pid = None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __getitem__(self, name):
+        return self.get()[name]
+
+# Nothing connects until the first query
+db = DatabaseHandle()
@@ -0,0 +1,131 @@
+# Libraries
+import atexit, os, re, sys, threading
+from posts import calculate_read_time
+from projection import EXCERPT_LENGTH
+from search import tokenize
+from workers import BackgroundWorker
+
+# Stamped on the derived fields. Bump it when they change and run `python content.py backfill`
+CONTENT_VERSION = 1
+# Fields computed from the content, dropped when the content changes
+DERIVED_FIELDS = ["excerpt", "wordCount", "searchTokens", "contentVersion"]
+
+# Markdown syntax removed from the plain text (posts are written in Markdown)
+MARKDOWN_PATTERNS = [
+    (re.compile(r"```.*?\n|```"), " "),                      # code fences
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r"\1"),          # images -> alt text
+    (re.compile(r"\[([^\]]*)\]\([^)]*\)"), r"\1"),           # links -> text
+    (re.compile(r"^\s{0,3}(#{1,6}|>+|[-*+]|\d+\.)\s+", re.MULTILINE), ""),  # headings, quotes, lists
+    (re.compile(r"[*_~`]+"), ""),                            # emphasis and inline code
+]
+HTML_PATTERN = re.compile(r"<[a-zA-Z/!]")
+
+# Content without Markdown syntax nor HTML tags, whitespace collapsed
+def plain_text(content):
+    text = content or ""
+    if HTML_PATTERN.search(text):
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(text, "html.parser")
+        for tag in soup(["script", "style"]):
+            tag.decompose()
+        text = soup.get_text(" ")
+    for pattern, replacement in MARKDOWN_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return " ".join(text.split())
+
+# First characters of the text, without cutting a word in half
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    if len(text) <= length:
+        return text
+    space = text.rfind(" ", 0, length)
+    return text[:space if space > 0 else length] + "…"
+
+# Fields derived from a post's content
+def derive_fields(content):
+    text = plain_text(content)
+    terms = {}
+    for term in tokenize(text):
+        terms[term] = terms.get(term, 0) + 1
+    return {
+        "excerpt": make_excerpt(text),
+        "wordCount": len(text.split()),
+        "readTime": calculate_read_time(text),
+        # Term frequencies of the content, used by the search index instead of tokenizing again
+        "searchTokens": terms,
+        "contentVersion": CONTENT_VERSION
+    }
+
+# Compute and store the derived fields of some posts. A post edited in the meantime
+# (different updatedAt) is skipped: its new content is queued by the edit
+def process_posts(db, post_ids):
+    from pymongo import UpdateOne
+    posts = list(db.posts.find({"_id": {"$in": list(post_ids)}}, {"title": 1, "content": 1, "status": 1, "updatedAt": 1}))
+    if not posts:
+        return []
+    for post in posts:
+        post.update(derive_fields(post.get("content")))
+    db.posts.bulk_write([
+        UpdateOne(
+            {"_id": post["_id"], "updatedAt": post.get("updatedAt")},
+            {"$set": {field: post[field] for field in ["excerpt", "wordCount", "readTime", "searchTokens", "contentVersion"]}}
+        )
+        for post in posts
+    ], ordered=False)
+    return posts
+
+# Background worker filling in the derived fields of created and edited posts,
+# so writes return without parsing the content
+class ContentProcessor(BackgroundWorker):
+    name = "content-processor"
+    description = "Content processing"
+
+    def __init__(self, db, interval=5.0, batch_size=100, on_processed=None):
+        super().__init__(interval)
+        self.db = db
+        self.batch_size = batch_size
+        self.on_processed = on_processed  # called with the processed posts (derived fields included)
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    # Queue a post whose content was created or changed, it is processed right away
+    def schedule(self, post_id):
+        with self.lock:
+            self.pending.add(post_id)
+        self.start()
+        self.wake.set()
+
+    def flush(self):
+        processed = 0
+        while True:
+            with self.lock:
+                batch = [self.pending.pop() for _ in range(min(self.batch_size, len(self.pending)))]
+            if not batch:
+                return processed
+            posts = process_posts(self.db, batch)
+            if posts and self.on_processed:
+                self.on_processed(posts)
+            processed += len(posts)
+
+def create_content_processor(db, on_processed=None):
+    processor = ContentProcessor(db, interval=float(os.getenv("CONTENT_PROCESS_INTERVAL", 5)), on_processed=on_processed)
+    atexit.register(processor.stop)
+    return processor
+
+# Process the posts without derived fields or with an older version, in batches
+def backfill(db, batch_size=200):
+    processed = 0
+    while True:
+        batch = [post["_id"] for post in db.posts.find({"contentVersion": {"$ne": CONTENT_VERSION}}, {"_id": 1}).limit(batch_size)]
+        if not batch:
+            return processed
+        processed += len(process_posts(db, batch))
+        print(f"Processed {processed} posts")
+
+# Usage: python content.py backfill
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "backfill":
+        print("Usage: python content.py backfill")
+        sys.exit(1)
+
+    from config import db
+    print(f"Done: {backfill(db)} posts processed")
@@ -0,0 +1,231 @@
+# Libraries
+import datetime, re, sys
+from projection import COMPUTED_FIELDS
+
+# Post totals kept in the post_counts collection, so paginated listings don't count
+# the posts of a filter on every page. One document per key, {_id: key, count}:
+#   status:<status>               every post with this status (get_posts)
+#   author:<userId>               every post of the author (get_my_posts)
+#   author:<userId>:<status>      (get_user_posts, get_my_posts?status=)
+# Each write to posts is followed by an atomic $inc of its keys. `python counters.py rebuild`
+# recounts them from the posts, and writes the marker below once done.
+#
+# Activity of each author's posts is rolled up in author_stats the same way,
+# {_id: userId, views, likes, comments}, for the profile page (GET /api/users/<user_id>/stats).
+# The rollups have their own marker: they were added after the counters, on databases
+# whose counters are already built.
+REBUILT_KEY = "rebuilt"
+AUTHOR_STATS_REBUILT_KEY = "rebuilt:author_stats"
+
+def count_keys(post):
+    author_id = (post.get("author") or {}).get("userId")
+    status = post.get("status")
+    keys = [f"status:{status}"]
+    if author_id:
+        keys += [f"author:{author_id}", f"author:{author_id}:{status}"]
+    return keys
+
+# Key holding the total of a listing filter, None for filters that aren't counted
+def filter_key(filter_query):
+    fields = set(filter_query)
+    if fields == {"status"}:
+        return f"status:{filter_query['status']}"
+    if fields == {"author.userId"}:
+        return f"author:{filter_query['author.userId']}"
+    if fields == {"author.userId", "status"}:
+        return f"author:{filter_query['author.userId']}:{filter_query['status']}"
+    return None
+
+# Add the deltas ({key: amount}) to the counters, in one unordered bulk_write
+def adjust(db, deltas):
+    from pymongo import UpdateOne
+    deltas = {key: amount for key, amount in deltas.items() if amount}
+    if deltas:
+        db.post_counts.bulk_write([
+            UpdateOne({"_id": key}, {"$inc": {"count": amount}}, upsert=True)
+            for key, amount in deltas.items()
+        ], ordered=False)
+
+def deltas_for(posts, amount):
+    deltas = {}
+    for post in posts:
+        for key in count_keys(post):
+            deltas[key] = deltas.get(key, 0) + amount
+    return deltas
+
+def posts_created(db, posts):
+    adjust(db, deltas_for(posts, 1))
+
+# A deleted post takes its views, likes and comments out of its author's totals
+def post_deleted(db, post):
+    adjust(db, deltas_for([post], -1))
+    author_id = (post.get("author") or {}).get("userId")
+    if author_id:
+        author_activity(db, {author_id: {
+            "views": -post.get("views", 0),
+            "likes": -post.get("likes", 0),
+            "comments": -(post.get("commentCount") if "commentCount" in post else len(post.get("comments") or []))
+        }})
+
+def status_changed(db, post, status):
+    deltas = deltas_for([post], -1)
+    for key, amount in deltas_for([{**post, "status": status}], 1).items():
+        deltas[key] = deltas.get(key, 0) + amount
+    adjust(db, deltas)
+
+# Posts restored with their counters (python posts.py import), replacing the `previous`
+# versions of the ones already in the database: keys and rollups move by the difference
+def posts_restored(db, posts, previous):
+    deltas = deltas_for(posts, 1)
+    for key, amount in deltas_for(previous, -1).items():
+        deltas[key] = deltas.get(key, 0) + amount
+    adjust(db, deltas)
+
+    activity = {}
+    for sign, group in ((1, posts), (-1, previous)):
+        for post in group:
+            author_id = (post.get("author") or {}).get("userId")
+            if author_id:
+                totals = activity.setdefault(author_id, {"views": 0, "likes": 0, "comments": 0})
+                totals["views"] += sign * post.get("views", 0)
+                totals["likes"] += sign * post.get("likes", 0)
+                totals["comments"] += sign * post.get("commentCount", 0)
+    author_activity(db, activity)
+
+# Add activity to the authors' rollups ({userId: {"views": n, "likes": n, "comments": n}})
+def author_activity(db, deltas):
+    from pymongo import UpdateOne
+    operations = []
+    for author_id, fields in deltas.items():
+        fields = {field: amount for field, amount in fields.items() if amount}
+        if author_id and fields:
+            operations.append(UpdateOne({"_id": author_id}, {"$inc": fields}, upsert=True))
+    if operations:
+        db.author_stats.bulk_write(operations, ordered=False)
+
+# Views flushed by the view counter ({post _id: views}), credited to the authors of the posts
+def views_written(db, views):
+    deltas = {}
+    for post in db.posts.find({"_id": {"$in": list(views)}}, {"author.userId": 1}):
+        author_id = (post.get("author") or {}).get("userId")
+        if author_id:
+            deltas.setdefault(author_id, {"views": 0})["views"] += views[post["_id"]]
+    author_activity(db, deltas)
+
+# Totals of views, likes and comments per author, computed from the posts
+def author_stats_pipeline(match=None):
+    return [
+        {"$match": match or {}},
+        {"$group": {
+            "_id": "$author.userId",
+            "views": {"$sum": {"$ifNull": ["$views", 0]}},
+            "likes": {"$sum": {"$ifNull": ["$likes", 0]}},
+            "comments": {"$sum": COMPUTED_FIELDS["commentCount"]}
+        }},
+        {"$match": {"_id": {"$ne": None}}}
+    ]
+
+# Reads the totals for paginate(). Until the counters have been rebuilt once
+# (fresh deploy on an existing database) it counts the documents instead
+class PostCounts:
+    def __init__(self):
+        self.ready = False
+        self.stats_ready = False
+
+    def is_ready(self, db):
+        if not self.ready and db.post_counts.find_one({"_id": REBUILT_KEY}, {"_id": 1}):
+            self.ready = True
+        return self.ready
+
+    # Whether the author rollups have been built, the endpoint aggregates the posts until then
+    def is_stats_ready(self, db):
+        if not self.stats_ready and db.post_counts.find_one({"_id": AUTHOR_STATS_REBUILT_KEY}, {"_id": 1}):
+            self.stats_ready = True
+        return self.stats_ready
+
+    # Total of posts matching a listing filter
+    def total(self, db, filter_query):
+        key = filter_key(filter_query)
+        if key is None or not self.is_ready(db):
+            return db.posts.count_documents(filter_query)
+        counter = db.post_counts.find_one({"_id": key}, {"count": 1})
+        return max(0, counter["count"]) if counter else 0
+
+    # Posts per status and activity of an author: two lookups by _id, whatever the number of posts
+    def author_stats(self, db, user_id):
+        if self.is_stats_ready(db):
+            stats = db.author_stats.find_one({"_id": user_id}) or {}
+        else:
+            stats = next(iter(db.posts.aggregate(author_stats_pipeline({"author.userId": user_id}))), {})
+
+        if self.is_ready(db):
+            prefix = f"author:{user_id}:"
+            by_status = {
+                counter["_id"][len(prefix):]: counter["count"]
+                for counter in db.post_counts.find({"_id": {"$regex": f"^{re.escape(prefix)}"}})
+                if counter["count"] > 0
+            }
+        else:
+            by_status = {
+                group["_id"]: group["count"]
+                for group in db.posts.aggregate([
+                    {"$match": {"author.userId": user_id}},
+                    {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+                ])
+            }
+        return {
+            "userId": user_id,
+            "posts": {"total": sum(by_status.values()), "byStatus": by_status},
+            "views": max(0, stats.get("views", 0)),
+            "likes": max(0, stats.get("likes", 0)),
+            "comments": max(0, stats.get("comments", 0))
+        }
+
+# Recount every key from the posts with one aggregation and replace the counters.
+# Writes that land while it runs can be lost, run it when posts aren't being written
+def rebuild_counts(db):
+    from pymongo import UpdateOne
+    groups = db.posts.aggregate([
+        {"$group": {"_id": {"author": "$author.userId", "status": "$status"}, "count": {"$sum": 1}}}
+    ])
+    counts = {}
+    for group in groups:
+        post = {"author": {"userId": group["_id"].get("author")}, "status": group["_id"].get("status")}
+        for key in count_keys(post):
+            counts[key] = counts.get(key, 0) + group["count"]
+
+    now = datetime.datetime.now(datetime.UTC).isoformat()
+    operations = [UpdateOne({"_id": key}, {"$set": {"count": count, "rebuiltAt": now}}, upsert=True) for key, count in counts.items()]
+    operations.append(UpdateOne({"_id": REBUILT_KEY}, {"$set": {"rebuiltAt": now}}, upsert=True))
+    db.post_counts.bulk_write(operations, ordered=False)
+    # Keys without posts anymore (the markers have no count)
+    db.post_counts.delete_many({"count": {"$exists": True}, "rebuiltAt": {"$ne": now}})
+    return counts
+
+# Recompute every author's rollup with one aggregation, replacing the collection ($out),
+# then write its marker
+def rebuild_author_stats(db):
+    db.posts.aggregate([*author_stats_pipeline(), {"$out": "author_stats"}])
+    db.post_counts.update_one(
+        {"_id": AUTHOR_STATS_REBUILT_KEY},
+        {"$set": {"rebuiltAt": datetime.datetime.now(datetime.UTC).isoformat()}},
+        upsert=True
+    )
+    return db.author_stats.count_documents({})
+
+# Build the counters and the author rollups on first start, each when its marker is missing
+def ensure_counts(db):
+    if not db.post_counts.find_one({"_id": AUTHOR_STATS_REBUILT_KEY}, {"_id": 1}):
+        rebuild_author_stats(db)
+    if not db.post_counts.find_one({"_id": REBUILT_KEY}, {"_id": 1}):
+        rebuild_counts(db)
+
+# Usage: python counters.py rebuild
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage: python counters.py rebuild")
+        sys.exit(1)
+
+    from config import db
+    authors = rebuild_author_stats(db)
+    print(f"Rebuilt {len(rebuild_counts(db))} counters and the stats of {authors} authors")
@@ -0,0 +1,91 @@
+# Libraries
+import base64, hashlib, json, os, re, threading, time
+from cachetools import TTLCache
+
+# Google's signing certificates for ID tokens (PEM, keyed by key id)
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+# Used when the certificate response has no max-age
+DEFAULT_CERTS_MAX_AGE = 300
+# Minimum seconds between two refetches triggered by an unknown key id
+MIN_REFRESH_INTERVAL = 30
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+# Key id of a token, read from its header without verifying it
+def token_key_id(token):
+    header = token.split(".")[0]
+    header += "=" * (-len(header) % 4)
+    return json.loads(base64.urlsafe_b64decode(header.encode())).get("kid")
+
+# Verifies Google ID tokens with a process-wide certificate cache that follows the
+# Cache-Control max-age of the certificate endpoint, a pooled HTTP session, and a
+# short-lived cache of the claims of tokens already verified
+class GoogleTokenVerifier:
+    def __init__(self, client_id, certs_url=GOOGLE_CERTS_URL, claims_ttl=300, claims_cache_size=10000, session=None):
+        self.client_id = client_id
+        self.certs_url = certs_url
+        self.claims_ttl = claims_ttl
+        self.claims = TTLCache(maxsize=claims_cache_size, ttl=claims_ttl)
+        self.certs = {}
+        self.certs_expire_at = 0
+        self.last_fetch = 0
+        self.lock = threading.Lock()
+        self.session = session
+
+    # Keep-alive connections to the certificate endpoint, created on first use
+    def http(self):
+        if self.session is None:
+            import requests
+            session = requests.Session()
+            session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            self.session = session
+        return self.session
+
+    def fetch_certs(self):
+        response = self.http().get(self.certs_url, timeout=5)
+        response.raise_for_status()
+        match = MAX_AGE_PATTERN.search(response.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE
+        max_age -= int(response.headers.get("Age", 0) or 0)
+
+        now = time.monotonic()
+        self.certs = response.json()
+        self.certs_expire_at = now + max(0, max_age)
+        self.last_fetch = now
+
+    # Cached certificates, refetched when they expire or when a token uses a key we don't know (rotation)
+    def get_certs(self, key_id=None):
+        with self.lock:
+            now = time.monotonic()
+            expired = now >= self.certs_expire_at
+            unknown_key = key_id is not None and key_id not in self.certs and now - self.last_fetch >= MIN_REFRESH_INTERVAL
+            if expired or unknown_key:
+                self.fetch_certs()
+            return self.certs
+
+    # Claims of a valid token, raises ValueError otherwise
+    def verify(self, token):
+        cache_key = hashlib.sha256(token.encode()).hexdigest()
+        with self.lock:
+            claims = self.claims.get(cache_key)
+        if claims is not None and claims["exp"] > time.time():
+            return dict(claims)
+
+        from google.auth import jwt
+        certs = self.get_certs(token_key_id(token))
+        claims = jwt.decode(token, certs=certs, audience=self.client_id)
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+
+        with self.lock:
+            self.claims[cache_key] = claims
+        return dict(claims)
+
+def create_google_verifier():
+    return GoogleTokenVerifier(
+        os.getenv("GOOGLE_CLIENT_ID"),
+        # Point it to a local stand-in to test without Google
+        certs_url=os.getenv("GOOGLE_CERTS_URL", GOOGLE_CERTS_URL),
+        claims_ttl=float(os.getenv("GOOGLE_CLAIMS_CACHE_TTL", 300))
+    )
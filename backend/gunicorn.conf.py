@@ -0,0 +1,66 @@
+# Production launcher: gunicorn server:app (this file is picked up automatically)
+import multiprocessing, os, sys
+from dotenv import load_dotenv
+load_dotenv()
+
+# Server socket
+bind = f"{os.getenv('HOST', '127.0.0.1')}:{os.getenv('PORT', 5000)}"
+
+# Workers: one process per core by default, each serving requests from a thread pool.
+# Every worker owns a Mongo pool of MONGO_MAX_POOL_SIZE connections, so keep it
+# at least GUNICORN_THREADS plus a couple for the background writers.
+# Load shedding (MAX_IN_FLIGHT, see admission.py) must stay below GUNICORN_THREADS.
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# Recycle workers now and then, with jitter so they don't all restart at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# Load the app in the master before forking (workers then reconnect in post_fork)
+preload_app = os.getenv("GUNICORN_PRELOAD", "False").lower() == "true"
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+
+# Create the indexes (and the post counters of an existing database) once,
+# from the master, with a short-lived client
+def on_starting(server):
+    from config import create_client
+    from indexes import bootstrap_indexes
+    from counters import ensure_counts
+    client = create_client()
+    try:
+        database = client.get_database(os.getenv("DB_NAME"))
+        bootstrap_indexes(database)
+        ensure_counts(database)
+    finally:
+        client.close()
+
+# A MongoClient is not fork-safe: give every worker its own client.
+# A client inherited from a preloaded master is replaced, otherwise the
+# handle connects lazily on the worker's first query.
+def post_fork(server, worker):
+    config = sys.modules.get("config")
+    if config and config.db.client is not None:
+        config.db.connect()
+
+# Logs of the app (slow requests, background job failures) go to gunicorn's error log, at its level
+def post_worker_init(worker):
+    import logging
+    error_log = logging.getLogger("gunicorn.error")
+    root = logging.getLogger()
+    root.handlers = error_log.handlers
+    root.setLevel(error_log.level)
+
+# Write the buffered view counts and author snapshots before the worker goes away
+def worker_exit(server, worker):
+    app_module = sys.modules.get("server")
+    if app_module:
+        app_module.view_counter.stop()
+        app_module.trending_ranking.stop()
+        app_module.author_refresher.stop()
+        app_module.content_processor.stop()
@@ -0,0 +1,143 @@
+# Libraries
+import os, sys
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+##############################################
+############## Index declarations ############
+##############################################
+
+# Indexes needed by the endpoints, grouped by collection
+INDEXES = {
+    "posts": [
+        # get_post_by_slug (unique: slugs are allocated by inserting and retrying on conflict)
+        IndexModel([("slug", ASCENDING)], name="slug_unique", unique=True),
+        # get_posts (feed filtered by status, newest first)
+        IndexModel([("status", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)], name="status_createdAt"),
+        # get_user_posts
+        IndexModel([("author.userId", ASCENDING), ("status", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)], name="author_status_createdAt"),
+        # get_my_posts without a status filter
+        IndexModel([("author.userId", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)], name="author_createdAt"),
+        # search index sync (posts changed since the last sync)
+        IndexModel([("updatedAt", ASCENDING)], name="updatedAt"),
+    ],
+    "comments": [
+        # get_comments (oldest first), delete_post
+        IndexModel([("postId", ASCENDING), ("createdAt", ASCENDING), ("_id", ASCENDING)], name="postId_createdAt"),
+        # author snapshot refresh
+        IndexModel([("author.userId", ASCENDING)], name="author"),
+    ],
+    "post_likes": [
+        # like_post, unlike_post, check_like (unique, so a user can like a post only once)
+        IndexModel([("postId", ASCENDING), ("userId", ASCENDING)], name="postId_userId", unique=True),
+        # check_likes
+        IndexModel([("userId", ASCENDING), ("postId", ASCENDING)], name="userId_postId"),
+    ],
+    "slug_history": [
+        # get_post_by_slug with a previous slug
+        IndexModel([("slug", ASCENDING)], name="slug", unique=True),
+        # delete_post
+        IndexModel([("postId", ASCENDING)], name="postId"),
+    ],
+    "trending": [
+        # get_trending_posts (highest rank first) and pruning
+        IndexModel([("rank", DESCENDING)], name="rank"),
+    ],
+    "users": [
+        # get_user_data, login upsert
+        IndexModel([("userId", ASCENDING)], name="userId", unique=True),
+        # register, login_email
+        IndexModel([("email", ASCENDING)], name="email"),
+    ],
+}
+
+# Representative endpoint queries: (endpoint, collection, filter, sort)
+QUERY_PLANS = [
+    ("get_posts", "posts", {"status": "published"}, [("createdAt", -1), ("_id", -1)]),
+    ("get_post_by_slug", "posts", {"slug": "sample-slug"}, None),
+    ("get_post_by_slug (previous slug)", "slug_history", {"slug": "sample-slug"}, None),
+    ("get_user_posts", "posts", {"author.userId": "sample-user", "status": "published"}, [("createdAt", -1), ("_id", -1)]),
+    ("get_my_posts", "posts", {"author.userId": "sample-user"}, [("createdAt", -1), ("_id", -1)]),
+    ("search_posts", "posts", {"updatedAt": {"$gt": "2000-01-01T00:00:00"}}, None),
+    ("get_trending_posts", "trending", {}, [("rank", -1)]),
+    ("get_comments", "comments", {"postId": "sample-post"}, [("createdAt", 1), ("_id", 1)]),
+    ("check_likes", "post_likes", {"userId": "sample-user", "postId": {"$in": ["sample-post"]}}, None),
+    ("check_like", "post_likes", {"postId": "sample-post", "userId": "sample-user"}, None),
+    ("get_user_data", "users", {"userId": "sample-user"}, None),
+    ("login_email", "users", {"email": "sample@example.com"}, None),
+]
+
+class QueryPlanError(RuntimeError):
+    pass
+
+##############################################
+################# Functions ##################
+##############################################
+
+# Older indexes on the same keys as a declared one, dropped before creating it.
+# posts.slug became unique: run `python slugs.py dedupe` first if slugs are duplicated
+REPLACED_INDEXES = {
+    "posts": [IndexModel([("slug", ASCENDING)], name="slug")],
+}
+
+# Create every declared index. create_indexes is a no-op for indexes that already exist
+def ensure_indexes(db):
+    dropped = {}
+    for collection, models in REPLACED_INDEXES.items():
+        existing = db[collection].index_information()
+        dropped[collection] = [model for model in models if model.document["name"] in existing]
+        for model in dropped[collection]:
+            db[collection].drop_index(model.document["name"])
+
+    created = {}
+    for collection, models in INDEXES.items():
+        try:
+            created[collection] = db[collection].create_indexes(models)
+        except OperationFailure as e:
+            # Duplicate keys: put the replaced indexes back until the data is fixed
+            if e.code == 11000 and dropped.get(collection):
+                db[collection].create_indexes(dropped[collection])
+            raise
+    return created
+
+# Collect the stage names of a query plan tree
+def plan_stages(plan):
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+# Explain every endpoint query and fail if any of them falls back to a collection scan
+def verify_query_plans(db):
+    failures = []
+    for endpoint, collection, filter_query, sort in QUERY_PLANS:
+        cursor = db[collection].find(filter_query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in plan_stages(winning_plan):
+            failures.append(f"{endpoint} ({collection} {filter_query})")
+    if failures:
+        raise QueryPlanError("Queries without index support: " + ", ".join(failures))
+
+# Boot-time setup, driven by ENSURE_INDEXES and VERIFY_QUERY_PLANS
+def bootstrap_indexes(db):
+    if os.getenv("ENSURE_INDEXES", "True").lower() == "true":
+        ensure_indexes(db)
+    if os.getenv("VERIFY_QUERY_PLANS", "False").lower() == "true":
+        verify_query_plans(db)
+
+# Usage: python indexes.py [--verify]
+if __name__ == "__main__":
+    from config import db
+    for collection, names in ensure_indexes(db).items():
+        print(f"{collection}: {', '.join(names)}")
+    if "--verify" in sys.argv:
+        verify_query_plans(db)
+        print("All endpoint queries are served by an index")
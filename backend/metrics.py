@@ -0,0 +1,178 @@
+# Libraries
+import logging, os, threading, time
+
+logger = logging.getLogger(__name__)
+
+# Prometheus' default buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COMMAND_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+COMMANDS_PER_REQUEST_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21)
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, values, amount=1):
+        self.values[values] = self.values.get(values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, values)} {total}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # label values -> [count per bucket, sum, count]
+
+    def observe(self, values, amount):
+        entry = self.values.get(values)
+        if entry is None:
+            entry = self.values[values] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if amount <= bound:
+                entry[0][i] += 1
+                break
+        entry[1] += amount
+        entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = format_labels(self.labels, values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = format_labels(self.labels, values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, values)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, values)} {count}")
+        return lines
+
+# Request and MongoDB metrics of this process, rendered in the Prometheus text format.
+# Each gunicorn worker keeps its own numbers, so scrape the workers one by one
+# (or run a single worker per container) rather than through a load balancer.
+class Metrics:
+    def __init__(self, slow_request_ms=None):
+        self.slow_request_ms = slow_request_ms
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started_at = time.time()
+        self.requests = Counter("postly_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+        self.latency = Histogram("postly_http_request_duration_seconds", "HTTP request latency.", ("method", "route"), LATENCY_BUCKETS)
+        self.request_commands = Histogram("postly_mongo_commands_per_request", "MongoDB commands sent by one request.", ("method", "route"), COMMANDS_PER_REQUEST_BUCKETS)
+        self.request_mongo_time = Histogram("postly_mongo_time_per_request_seconds", "Time one request spent in MongoDB commands.", ("method", "route"), LATENCY_BUCKETS)
+        self.commands = Counter("postly_mongo_commands_total", "MongoDB commands by name and outcome (requests and background jobs).", ("command", "outcome"))
+        self.command_latency = Histogram("postly_mongo_command_duration_seconds", "MongoDB command latency.", ("command",), COMMAND_BUCKETS)
+        self.rejections = Counter("postly_http_requests_rejected_total", "Requests rejected before running, by route class and reason (rate_limited, overloaded).", ("class", "reason"))
+
+    ############ Request tracing ############
+
+    # Called before each request, commands sent by this thread are attributed to it
+    def start_request(self):
+        self.local.trace = {"start": time.perf_counter(), "commands": 0, "mongoSeconds": 0.0}
+
+    def finish_request(self, method, route, status):
+        trace = getattr(self.local, "trace", None)
+        if trace is None:
+            return None
+        self.local.trace = None
+        trace["seconds"] = time.perf_counter() - trace["start"]
+        with self.lock:
+            self.requests.inc((method, route, str(status)))
+            self.latency.observe((method, route), trace["seconds"])
+            self.request_commands.observe((method, route), trace["commands"])
+            self.request_mongo_time.observe((method, route), trace["mongoSeconds"])
+
+        if self.slow_request_ms is not None and trace["seconds"] * 1000 >= self.slow_request_ms:
+            logger.warning(
+                "Slow request: %s %s %s took %.1f ms, %d MongoDB commands (%.1f ms)",
+                method, route, status, trace["seconds"] * 1000, trace["commands"], trace["mongoSeconds"] * 1000
+            )
+        return trace
+
+    # A request turned away by admission control (see admission.py)
+    def rejected(self, route_class, reason):
+        with self.lock:
+            self.rejections.inc((route_class, reason))
+
+    ############ MongoDB commands ############
+
+    def command_finished(self, command, seconds, outcome):
+        trace = getattr(self.local, "trace", None)
+        if trace is not None:
+            trace["commands"] += 1
+            trace["mongoSeconds"] += seconds
+        with self.lock:
+            self.commands.inc((command, outcome))
+            self.command_latency.observe((command,), seconds)
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.request_commands, self.request_mongo_time, self.commands, self.command_latency, self.rejections):
+                lines.extend(metric.render())
+        lines.append("# HELP postly_process_start_time_seconds Start time of the process since the epoch.")
+        lines.append("# TYPE postly_process_start_time_seconds gauge")
+        lines.append(f"postly_process_start_time_seconds {self.started_at}")
+        return "\n".join(lines) + "\n"
+
+# pymongo only accepts subclasses of its listener classes, the class is built on
+# first use so importing this module doesn't import pymongo
+def command_listener(metrics):
+    from pymongo import monitoring
+
+    class CommandListener(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            metrics.command_finished(event.command_name, event.duration_micros / 1e6, "success")
+
+        def failed(self, event):
+            metrics.command_finished(event.command_name, event.duration_micros / 1e6, "failure")
+
+    return CommandListener()
+
+# Time every request of the app and add a Server-Timing header with its MongoDB share
+def install(app, metrics):
+    from flask import request
+
+    @app.before_request
+    def start_trace():
+        metrics.start_request()
+
+    @app.after_request
+    def finish_trace(response):
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        trace = metrics.finish_request(request.method, route, response.status_code)
+        if trace is not None:
+            response.headers.add(
+                "Server-Timing",
+                f'db;dur={trace["mongoSeconds"] * 1000:.2f};desc="{trace["commands"]} commands", app;dur={trace["seconds"] * 1000:.2f}'
+            )
+        return response
+
+def create_metrics():
+    slow_request_ms = os.getenv("SLOW_REQUEST_MS")
+    return Metrics(slow_request_ms=float(slow_request_ms) if slow_request_ms else None)
+
+# Shared by the app and the MongoDB client (see config.create_client)
+metrics = create_metrics()
@@ -0,0 +1,77 @@
+# Libraries
+import base64, json
+from bson.objectid import ObjectId
+
+# Feeds are ordered newest first, _id breaks ties between documents created at the same instant
+NEWEST_FIRST = -1
+OLDEST_FIRST = 1
+
+def sort_order(direction=NEWEST_FIRST):
+    return [("createdAt", direction), ("_id", direction)]
+
+# Encode the position of a document as an opaque cursor
+def encode_cursor(doc):
+    raw = json.dumps({"createdAt": doc["createdAt"], "_id": str(doc["_id"])}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+# Decode a cursor back into its (createdAt, _id) position
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return data["createdAt"], ObjectId(data["_id"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+# Restrict a filter to the documents that come after the cursor position
+def after_cursor(filter_query, cursor, direction=NEWEST_FIRST):
+    created_at, last_id = decode_cursor(cursor)
+    operator = "$lt" if direction == NEWEST_FIRST else "$gt"
+    return {
+        "$and": [
+            filter_query,
+            {"$or": [
+                {"createdAt": {operator: created_at}},
+                {"createdAt": created_at, "_id": {operator: last_id}}
+            ]}
+        ]
+    }
+
+# Run a paginated query over a collection, newest first unless told otherwise.
+# With ?cursor= (or ?after=) the query seeks straight to the position so every page
+# costs the same; otherwise the legacy ?page= offset pagination is used, with a
+# total count unless count is False. count can also be a function returning the total
+# of the filter (materialized counters, see counters.py) instead of counting the documents.
+def paginate(collection, filter_query, args, projection=None, direction=NEWEST_FIRST, count=True, default_limit=10):
+    limit = int(args.get("limit", default_limit))
+    if limit < 1:
+        raise ValueError("Limit must be a positive integer")
+    cursor = args.get("cursor") or args.get("after")
+
+    if cursor:
+        query = collection.find(after_cursor(filter_query, cursor, direction), projection)
+    else:
+        page = int(args.get("page", 1))
+        if page < 1:
+            raise ValueError("Page must be a positive integer")
+        query = collection.find(filter_query, projection).skip((page - 1) * limit)
+
+    # Fetch one extra document to know if there is a next page
+    docs = list(query.sort(sort_order(direction)).limit(limit + 1))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+
+    pagination = {
+        "limit": limit,
+        "nextCursor": encode_cursor(docs[-1]) if has_more else None
+    }
+    if not cursor:
+        pagination["page"] = page
+    if not cursor and count:
+        total = count(filter_query) if callable(count) else collection.count_documents(filter_query)
+        pagination.update({
+            "total": total,
+            "totalPages": (total + limit - 1) // limit
+        })
+
+    return docs, pagination
@@ -0,0 +1,156 @@
+# Libraries
+import logging, multiprocessing, os, threading, time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# werkzeug method string, PASSWORD_HASH_METHOD can also give a short name ("scrypt", "pbkdf2:sha256")
+DEFAULT_METHOD = "scrypt:32768:8:1"
+
+class HashingBusy(Exception):
+    pass
+
+##############################################
+########## Run in the worker processes #######
+##############################################
+
+def hash_password(password, method):
+    from werkzeug.security import generate_password_hash
+    start = time.perf_counter()
+    return generate_password_hash(password, method=method), time.perf_counter() - start
+
+# Method as werkzeug writes it in its hashes, parameters included ("scrypt" -> "scrypt:32768:8:1"),
+# taken from a hash of a dummy value
+def full_method(method):
+    from werkzeug.security import generate_password_hash
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+def verify_password(password_hash, password):
+    from werkzeug.security import check_password_hash
+    start = time.perf_counter()
+    return check_password_hash(password_hash, password), time.perf_counter() - start
+
+##############################################
+################ Password hasher #############
+##############################################
+
+# Runs the password KDF in a bounded process pool so a burst of logins can't pin
+# the request threads. When too many hashes are pending it fails fast with HashingBusy.
+class PasswordHasher:
+    def __init__(self, method=DEFAULT_METHOD, workers=2, max_pending=8, timeout=10.0):
+        # Compared with the prefix of stored hashes by needs_rehash
+        self.method = full_method(method)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.executor = None
+        self.pid = None
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.metrics = {
+            "hash": {"count": 0, "totalSeconds": 0.0, "maxSeconds": 0.0},
+            "verify": {"count": 0, "totalSeconds": 0.0, "maxSeconds": 0.0},
+            "rejected": 0,
+            "timedOut": 0
+        }
+
+    # The pool is created on first use, by the process that uses it
+    def pool(self):
+        if self.executor is None or self.pid != os.getpid():
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            self.pid = os.getpid()
+        return self.executor
+
+    def submit(self, function, *args):
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.metrics["rejected"] += 1
+                raise HashingBusy("Too many password operations in progress, try again shortly")
+            self.pending += 1
+            try:
+                try:
+                    future = self.pool().submit(function, *args)
+                except BrokenProcessPool:
+                    # A worker process died: start a new pool once
+                    self.executor = None
+                    future = self.pool().submit(function, *args)
+            except Exception:
+                # Nothing was queued, give the slot back (the retry included)
+                self.pending -= 1
+                raise
+        future.add_done_callback(self.release)
+        return future
+
+    def release(self, future):
+        with self.lock:
+            self.pending -= 1
+
+    def record(self, operation, seconds):
+        with self.lock:
+            metric = self.metrics[operation]
+            metric["count"] += 1
+            metric["totalSeconds"] += seconds
+            metric["maxSeconds"] = max(metric["maxSeconds"], seconds)
+
+    # Wait for a pool result, timing the whole operation (queue wait included).
+    # A pool too slow to answer in time is busy as well: HashingBusy (503)
+    def run(self, operation, function, *args):
+        start = time.perf_counter()
+        future = self.submit(function, *args)
+        try:
+            result, _ = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Still queued: drop it (the slot is given back by release). Running: let it finish
+            future.cancel()
+            with self.lock:
+                self.metrics["timedOut"] += 1
+            raise HashingBusy("Password hashing is taking too long, try again shortly")
+        self.record(operation, time.perf_counter() - start)
+        return result
+
+    def hash(self, password):
+        return self.run("hash", hash_password, password, self.method)
+
+    def verify(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self.run("verify", verify_password, password_hash, password)
+
+    # Hashes made with other parameters than the configured ones
+    def needs_rehash(self, password_hash):
+        return bool(password_hash) and password_hash.split("$", 1)[0] != self.method
+
+    # Compute a new hash in the background and hand it to save(new_hash). Skipped when busy
+    def rehash_later(self, password, save):
+        try:
+            future = self.submit(hash_password, password, self.method)
+        except HashingBusy:
+            return False
+
+        def done(future):
+            try:
+                new_hash, seconds = future.result()
+                self.record("hash", seconds)
+                save(new_hash)
+            except Exception as e:
+                logger.exception("Password rehash failed: %s", e)
+        future.add_done_callback(done)
+        return True
+
+    def stats(self):
+        with self.lock:
+            stats = {"method": self.method, "workers": self.workers, "maxPending": self.max_pending, "pending": self.pending, "rejected": self.metrics["rejected"], "timedOut": self.metrics["timedOut"]}
+            for operation in ("hash", "verify"):
+                metric = self.metrics[operation]
+                stats[operation] = dict(metric, avgSeconds=metric["totalSeconds"] / metric["count"] if metric["count"] else 0)
+            return stats
+
+def create_password_hasher():
+    workers = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    return PasswordHasher(
+        method=os.getenv("PASSWORD_HASH_METHOD", DEFAULT_METHOD),
+        workers=workers,
+        max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", workers * 4)),
+        timeout=float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+    )
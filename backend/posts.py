@@ -0,0 +1,239 @@
+# Libraries
+import datetime, sys
+from bson.objectid import ObjectId
+from serialization import encode, decode
+from slugs import create_slug, suffixed_slug, is_slug_conflict, with_unique_slug, insert_post
+from projection import FULL_PROJECTION
+from counters import posts_created, posts_restored
+
+# Posts written per insert_many, and read per cursor batch when exporting
+IMPORT_CHUNK_SIZE = 500
+EXPORT_BATCH_SIZE = 500
+# Import errors listed in the result, the rest are only counted
+MAX_REPORTED_ERRORS = 100
+# Counters of a post kept by a restore
+RESTORED_COUNTERS = ("views", "likes", "commentCount")
+
+# Calculate read time
+def calculate_read_time(content):
+    words = len(content.split())
+    return max(1, round(words / 200))  # Assuming 200 words per minute
+
+# Build a post document for the posts collection
+def post_document(post_data, author, slug, created_at=None):
+    now = datetime.datetime.now(datetime.UTC).isoformat()
+    return {
+        "title": post_data["title"],
+        "content": post_data["content"],
+        "author": author,
+        "slug": slug,
+        "createdAt": created_at or now,
+        "updatedAt": now,
+        "status": post_data.get("status", "published"),
+        "readTime": calculate_read_time(post_data["content"]),
+        "views": 0,
+        "likes": 0,
+        "commentCount": 0,
+        # Add cover image if It is present
+        "coverImage": post_data.get("coverImage")
+    }
+
+##############################################
+################### Export ###################
+##############################################
+
+# Stream posts as NDJSON, one document per line. The cursor is read in batches,
+# so memory stays constant whatever the number of posts
+def export_posts(db, filter_query=None, sort=None, batch_size=EXPORT_BATCH_SIZE):
+    cursor = db.posts.find(filter_query or {}, FULL_PROJECTION).sort(sort or [("_id", 1)]).batch_size(batch_size)
+    try:
+        for post in cursor:
+            yield encode(post) + b"\n"
+    finally:
+        cursor.close()
+
+##############################################
+################### Import ###################
+##############################################
+
+# Parse NDJSON lines into (line number, post or None, error or None)
+def read_ndjson(lines):
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            post = decode(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(post, dict):
+            yield number, None, "Expected a JSON object"
+        elif not isinstance(post.get("title"), str) or not post["title"].strip():
+            yield number, None, "Title is required"
+        elif not isinstance(post.get("content"), str) or not post["content"].strip():
+            yield number, None, "Content is required"
+        else:
+            yield number, post, None
+
+# Creation date of a restored post, in UTC. Listings sort on it as a string,
+# so it has to be a real date and not in the future
+def restored_created_at(value):
+    try:
+        created_at = datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid createdAt: {value}")
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=datetime.UTC)
+    created_at = created_at.astimezone(datetime.UTC)
+    if created_at > datetime.datetime.now(datetime.UTC):
+        raise ValueError(f"createdAt is in the future: {value}")
+    return created_at.isoformat()
+
+# Fields of an exported post kept by a restore, parsed: _id (comments and likes point to it),
+# createdAt and the counters. Raises ValueError when one of them is invalid
+def restored_fields(post):
+    fields = {}
+    if post.get("_id") is not None:
+        if not ObjectId.is_valid(str(post["_id"])):
+            raise ValueError(f"Invalid _id: {post['_id']}")
+        fields["_id"] = ObjectId(str(post["_id"]))
+    if post.get("createdAt") is not None:
+        fields["createdAt"] = restored_created_at(post["createdAt"])
+    for field in RESTORED_COUNTERS:
+        value = post.get(field, 0)
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError(f"Invalid {field}: {value}")
+        fields[field] = value
+    return fields
+
+# Slugs that are unique among the posts and within the batch, checked with a single query.
+# A restored post keeps its slug when the post holding it is itself (ids, None for new posts)
+def unique_slugs(db, slugs, ids=None):
+    ids = ids or [None] * len(slugs)
+    taken = {post["slug"]: post["_id"] for post in db.posts.find({"slug": {"$in": list(set(slugs))}}, {"slug": 1})}
+    result = []
+    for slug, post_id in zip(slugs, ids):
+        if slug in taken and (post_id is None or taken[slug] != post_id):
+            slug = suffixed_slug(slug)
+        taken[slug] = post_id
+        result.append(slug)
+    return result
+
+# Write a restored post over the one with its _id, or insert a new post
+def write_post(db, document):
+    if "_id" not in document:
+        return insert_post(db, document)
+    with_unique_slug(document, lambda: db.posts.replace_one({"_id": document["_id"]}, document, upsert=True))
+    return document
+
+# Build and insert the documents of one chunk. Restored posts (restore=True) keep their
+# _id, createdAt and counters, and replace the post with the same _id if there is one
+def insert_chunk(db, posts, author, restore=False):
+    from pymongo import InsertOne, ReplaceOne
+    from pymongo.errors import BulkWriteError
+    restored = [
+        {field: post[field] for field in ("_id", "createdAt", *RESTORED_COUNTERS) if field in post} if restore else {}
+        for post in posts
+    ]
+    slugs = unique_slugs(
+        db,
+        [create_slug(post.get("slug") or post["title"]) for post in posts],
+        [fields.get("_id") for fields in restored]
+    )
+    documents = []
+    for post, slug, fields in zip(posts, slugs, restored):
+        document = post_document(post, author or post.get("author"), slug, fields.get("createdAt"))
+        document.update(fields)
+        documents.append(document)
+
+    ids = [document["_id"] for document in documents if "_id" in document]
+    previous = list(db.posts.find({"_id": {"$in": ids}}, {"author.userId": 1, "status": 1, **{field: 1 for field in RESTORED_COUNTERS}})) if ids else []
+    try:
+        if ids:
+            db.posts.bulk_write([
+                ReplaceOne({"_id": document["_id"]}, document, upsert=True) if "_id" in document else InsertOne(document)
+                for document in documents
+            ], ordered=False)
+        else:
+            db.posts.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        # Slugs taken since they were checked are written again one by one, with a suffix
+        errors = e.details["writeErrors"]
+        if not all(error["code"] == 11000 and is_slug_conflict(error) for error in errors):
+            raise
+        for error in errors:
+            document = documents[error["index"]]
+            document["slug"] = suffixed_slug(document["slug"])
+            write_post(db, document)
+    if restore:
+        posts_restored(db, documents, previous)
+    else:
+        posts_created(db, documents)
+    return documents
+
+# Import posts from (line number, post, error) rows in chunks of insert_many.
+# The author replaces the one of the documents when given. Imports through the API
+# create new posts (the client's createdAt and counters are ignored); restore=True
+# (python posts.py import) puts exported posts back with their _id, createdAt and counters.
+# on_chunk(documents) is called after each chunk is written
+def import_posts(db, rows, author=None, chunk_size=IMPORT_CHUNK_SIZE, on_chunk=None, restore=False):
+    imported, failed, errors, chunk = 0, 0, [], []
+
+    def flush():
+        documents = insert_chunk(db, chunk, author, restore)
+        if on_chunk:
+            on_chunk(documents)
+        chunk.clear()
+        return len(documents)
+
+    for number, post, error in rows:
+        if error is None and not author and not (isinstance(post.get("author"), dict) and post["author"].get("userId")):
+            error = "Author is required"
+        if error is None and restore:
+            try:
+                post = {**post, **restored_fields(post)}
+            except ValueError as e:
+                error = str(e)
+        if error:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": number, "error": error})
+            continue
+        chunk.append(post)
+        if len(chunk) >= chunk_size:
+            imported += flush()
+    if chunk:
+        imported += flush()
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+# Usage:
+#   python posts.py export [file]          (every post, stdout by default)
+#   python posts.py import <file> [userId] (restores the posts with their _id, createdAt and counters,
+#                                           as the given user or keeping each post's author)
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("export", "import") or (sys.argv[1] == "import" and len(sys.argv) < 3):
+        print("Usage: python posts.py export [file] | python posts.py import <file> [userId]")
+        sys.exit(1)
+
+    from config import db
+    if sys.argv[1] == "export":
+        output = open(sys.argv[2], "wb") if len(sys.argv) > 2 else sys.stdout.buffer
+        with output:
+            for line in export_posts(db):
+                output.write(line)
+    else:
+        author = None
+        if len(sys.argv) > 3:
+            from users import user_data
+            user = db.users.find_one({"userId": sys.argv[3]})
+            if not user:
+                print(f"User not found: {sys.argv[3]}")
+                sys.exit(1)
+            author = user_data(user)
+        # Derived fields (excerpt, word count, search tokens) are computed as the chunks are written
+        from content import process_posts
+        with open(sys.argv[2], "rb") as lines:
+            result = import_posts(db, read_ndjson(lines), author, on_chunk=lambda documents: process_posts(db, [post["_id"] for post in documents]), restore=True)
+        print(f"Imported {result['imported']} posts, {result['failed']} failed")
+        for error in result["errors"]:
+            print(f"Line {error['line']}: {error['error']}")
@@ -0,0 +1,55 @@
+# Characters of content returned as the excerpt of a post card
+EXCERPT_LENGTH = 300
+
+# Fields stored on the post documents
+POST_FIELDS = {
+    "title", "content", "author", "slug", "createdAt", "updatedAt", "status",
+    "readTime", "views", "likes", "commentCount", "coverImage", "wordCount"
+}
+
+# Fields computed by Mongo while projecting, so the body never leaves the server
+COMPUTED_FIELDS = {
+    # Stored by the content processor (plain text), cut from the content until then
+    "excerpt": {"$ifNull": ["$excerpt", {"$substrCP": [{"$ifNull": ["$content", ""]}, 0, EXCERPT_LENGTH]}]},
+    # Posts not migrated to the comments collection yet still embed their comments
+    "commentCount": {"$ifNull": ["$commentCount", {"$size": {"$ifNull": ["$comments", []]}}]},
+}
+
+# What a post card needs
+SUMMARY_FIELDS = [
+    "title", "slug", "author", "createdAt", "updatedAt", "status", "readTime",
+    "views", "likes", "coverImage", "excerpt", "commentCount", "wordCount"
+]
+
+# Whole documents without the fields only the server uses
+FULL_PROJECTION = {"searchTokens": 0}
+
+# Build a find() projection from a list of field names
+def build_projection(fields):
+    # createdAt is always returned because cursors are built from it
+    projection = {"createdAt": 1}
+    for field in fields:
+        if field in COMPUTED_FIELDS:
+            projection[field] = COMPUTED_FIELDS[field]
+        elif field in POST_FIELDS:
+            projection[field] = 1
+        else:
+            raise ValueError(f"Unknown field: {field}")
+    return projection
+
+SUMMARY_PROJECTION = build_projection(SUMMARY_FIELDS)
+
+# Projection for a listing endpoint:
+# ?fields=title,slug,... picks the fields, ?view=full returns whole documents,
+# and the default summary view returns what a post card needs
+def list_projection(args):
+    fields = args.get("fields")
+    if fields:
+        return build_projection([field.strip() for field in fields.split(",") if field.strip()])
+
+    view = args.get("view", "summary")
+    if view == "summary":
+        return SUMMARY_PROJECTION
+    if view == "full":
+        return FULL_PROJECTION
+    raise ValueError(f"Unknown view: {view}")
@@ -0,0 +1,196 @@
+# Libraries
+import bisect, math, re, threading, time
+from bson.objectid import ObjectId
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+# Title terms count as much as this many occurrences in the content
+TITLE_WEIGHT = 2
+# Score factor for terms matched by prefix instead of exactly
+PREFIX_WEIGHT = 0.7
+# Maximum number of vocabulary terms a query token can expand to
+MAX_PREFIX_EXPANSIONS = 50
+# Minimum seconds between two syncs against the database
+SYNC_INTERVAL = 5
+# Characters shown around the first match in a snippet
+SNIPPET_BEFORE = 60
+SNIPPET_AFTER = 160
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Split a text into lowercase terms
+def tokenize(text):
+    return [token.lower() for token in TOKEN_PATTERN.findall(text or "")]
+
+# In-memory inverted index over the published posts with BM25 ranking
+class SearchIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.postings = {}      # term -> {postId: weighted term frequency}
+        self.doc_terms = {}     # postId -> set of terms (to remove a post)
+        self.doc_lengths = {}   # postId -> weighted length
+        self.total_length = 0
+        self.vocabulary = None  # sorted list of terms, rebuilt lazily for prefix lookups
+        self.loaded = False
+        self.last_updated_at = ""
+        self.last_sync = 0
+
+    # Add or replace a post in the index. content_terms are the term frequencies
+    # of the content when they are already known (searchTokens of the post)
+    def add(self, post_id, title, content, content_terms=None):
+        frequencies = dict(content_terms) if content_terms is not None else {}
+        if content_terms is None:
+            for term in tokenize(content):
+                frequencies[term] = frequencies.get(term, 0) + 1
+        for term in tokenize(title):
+            frequencies[term] = frequencies.get(term, 0) + TITLE_WEIGHT
+
+        with self.lock:
+            self.remove(post_id)
+            for term, frequency in frequencies.items():
+                if term not in self.postings:
+                    self.postings[term] = {}
+                    self.vocabulary = None
+                self.postings[term][post_id] = frequency
+            length = sum(frequencies.values())
+            self.doc_terms[post_id] = set(frequencies)
+            self.doc_lengths[post_id] = length
+            self.total_length += length
+
+    # Remove a post from the index (no-op if it is not indexed)
+    def remove(self, post_id):
+        with self.lock:
+            terms = self.doc_terms.pop(post_id, None)
+            if terms is None:
+                return
+            for term in terms:
+                documents = self.postings[term]
+                documents.pop(post_id, None)
+                if not documents:
+                    del self.postings[term]
+                    self.vocabulary = None
+            self.total_length -= self.doc_lengths.pop(post_id)
+
+    # Index a post document if it is published, drop it otherwise
+    def index_post(self, post):
+        post_id = str(post["_id"])
+        if post.get("status") == "published":
+            self.add(post_id, post.get("title", ""), post.get("content", ""), post.get("searchTokens"))
+        else:
+            self.remove(post_id)
+
+    # Load the index from the database on first use, then pick up posts changed by other processes
+    def sync(self, db, force=False):
+        if not force and time.monotonic() - self.last_sync < SYNC_INTERVAL:
+            return
+        with self.lock:
+            # The content is only read for posts the content processor hasn't tokenized yet
+            projection = {"title": 1, "searchTokens": 1, "status": 1, "updatedAt": 1}
+            if self.loaded:
+                cursor = db.posts.find({"updatedAt": {"$gt": self.last_updated_at}}, projection)
+            else:
+                cursor = db.posts.find({"status": "published"}, projection)
+            untokenized = []
+            for post in cursor:
+                if post.get("searchTokens") is None and post.get("status") == "published":
+                    untokenized.append(post["_id"])
+                else:
+                    self.index_post(post)
+                self.last_updated_at = max(self.last_updated_at, post.get("updatedAt", ""))
+            for start in range(0, len(untokenized), 500):
+                for post in db.posts.find({"_id": {"$in": untokenized[start:start + 500]}}, {"title": 1, "content": 1, "status": 1}):
+                    self.index_post(post)
+            self.loaded = True
+            self.last_sync = time.monotonic()
+
+    # Vocabulary terms starting with a prefix
+    def expand(self, prefix):
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        expansions = []
+        for term in self.vocabulary[start:]:
+            if not term.startswith(prefix) or len(expansions) >= MAX_PREFIX_EXPANSIONS:
+                break
+            expansions.append(term)
+        return expansions
+
+    # Rank the indexed posts for a query. Returns ([(postId, score)], matched terms)
+    def search(self, query):
+        with self.lock:
+            documents = len(self.doc_lengths)
+            if not documents:
+                return [], set()
+            average_length = self.total_length / documents
+
+            # Every query token matches exactly and, with a lower weight, as a prefix
+            weights = {}
+            for token in set(tokenize(query)):
+                for term in self.expand(token):
+                    weight = 1.0 if term == token else PREFIX_WEIGHT
+                    weights[term] = max(weights.get(term, 0), weight)
+
+            scores = {}
+            for term, weight in weights.items():
+                matches = self.postings[term]
+                idf = math.log(1 + (documents - len(matches) + 0.5) / (len(matches) + 0.5))
+                for post_id, frequency in matches.items():
+                    norm = K1 * (1 - B + B * self.doc_lengths[post_id] / average_length)
+                    scores[post_id] = scores.get(post_id, 0) + weight * idf * frequency * (K1 + 1) / (frequency + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked, set(weights)
+
+# Text around the first matched term of the content
+def make_snippet(content, terms):
+    content = content or ""
+    for match in TOKEN_PATTERN.finditer(content):
+        if match.group().lower() in terms:
+            start = max(0, match.start() - SNIPPET_BEFORE)
+            end = min(len(content), match.end() + SNIPPET_AFTER)
+            break
+    else:
+        start, end = 0, min(len(content), SNIPPET_BEFORE + SNIPPET_AFTER)
+
+    # Do not cut words in half
+    if start > 0:
+        space = content.find(" ", start)
+        start = space + 1 if 0 <= space < end else start
+    if end < len(content):
+        space = content.rfind(" ", start, end)
+        end = space if space > start else end
+
+    snippet = " ".join(content[start:end].split())
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(content) else "")
+
+# Fetch a page of ranked results with their snippets
+def search_page(db, index, query, page, limit, projection=None):
+    index.sync(db)
+    ranked, terms = index.search(query)
+    hits = ranked[(page - 1) * limit:page * limit]
+
+    # The content is always fetched to build the snippet, and dropped afterwards if it was not asked for
+    # (exclusion projections such as the full view already return it)
+    excluding = projection is not None and all(value == 0 for field, value in projection.items() if field != "_id")
+    strip_content = projection is not None and not excluding and "content" not in projection
+    if strip_content:
+        projection = {**projection, "content": 1}
+    documents = db.posts.find({"_id": {"$in": [ObjectId(post_id) for post_id, _ in hits]}, "status": "published"}, projection)
+    posts = {str(post["_id"]): post for post in documents}
+
+    results = []
+    for post_id, score in hits:
+        post = posts.get(post_id)
+        if not post:
+            # Deleted or unpublished by another process since the last sync
+            index.remove(post_id)
+            continue
+        post["score"] = round(score, 4)
+        post["snippet"] = make_snippet(post.get("content"), terms)
+        if strip_content:
+            post.pop("content", None)
+        results.append(post)
+    return results, len(ranked)
+
+search_index = SearchIndex()
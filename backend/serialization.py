@@ -0,0 +1,59 @@
+# Libraries
+import datetime, json
+from bson.objectid import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is much faster than the json module, the provider falls back to json without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Types that come straight from MongoDB: ObjectIds as their hex string, dates as ISO 8601
+def bson_default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    return DefaultJSONProvider.default(obj)
+
+# UTF-8 JSON of a value, also used outside requests (NDJSON export)
+def encode(obj, pretty=False):
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=bson_default, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0))
+        except orjson.JSONEncodeError:
+            # Values orjson refuses (integers over 64 bits, ...) go through json
+            pass
+    options = {"indent": 2} if pretty else {"separators": (",", ":")}
+    return json.dumps(obj, default=bson_default, ensure_ascii=False, **options).encode()
+
+# Parse JSON text or UTF-8 bytes
+def decode(s):
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+# JSON provider of the app: documents are returned as they come from MongoDB,
+# without converting their ids first, and encoded with orjson when it is installed
+class MongoJSONProvider(DefaultJSONProvider):
+    default = staticmethod(bson_default)
+    ensure_ascii = False
+    sort_keys = False
+
+    def pretty(self):
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            return encode(obj, self.pretty()).decode()
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if not kwargs:
+            return decode(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(encode(obj, self.pretty()) + b"\n", mimetype=self.mimetype)
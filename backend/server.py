@@ -1,78 +1,106 @@
 # Libraries
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, Response, request, jsonify, stream_with_context
 from http import HTTPStatus
 from config import db
+from pagination import paginate, OLDEST_FIRST
+from comments import comment_document
+from counters import PostCounts, posts_created, post_deleted, status_changed, author_activity, views_written
+from posts import calculate_read_time, post_document, export_posts, read_ndjson, import_posts
+from content import create_content_processor, DERIVED_FIELDS
+from projection import list_projection, FULL_PROJECTION
+from slugs import create_slug, with_unique_slug, insert_post, record_previous_slug, find_post_by_slug
+from users import create_user_cache, create_author_refresher
+from search import search_index, search_page
+from views import create_view_counter
+from trending import create_trending_ranking
+from cache import response_cache, FEED, CACHED_PAGES, post_tag, comments_tag
+from google_auth import create_google_verifier
+from passwords import create_password_hasher, HashingBusy
+from metrics import metrics, install as install_metrics
+from admission import create_rate_limiter, create_load_shedder, install as install_admission
+from serialization import MongoJSONProvider
+from conditional import conditional_json
+from compression import install as install_compression
 from flask_cors import CORS
 from dotenv import load_dotenv
-import os, datetime, re
+import os, datetime, functools, hmac
 from bson.objectid import ObjectId
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity, create_access_token
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-from werkzeug.security import generate_password_hash, check_password_hash
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)  # Warning: this enables CORS for all origins
+# Every endpoint is registered on this blueprint, the app is built by create_app()
+api = Blueprint("api", __name__)
 
-# JWT Configuration
-app.config['JWT_SECRET_KEY'] = os.getenv("JWT_SECRET_KEY", "your-secret-key")
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = datetime.timedelta(days=7)
-jwt = JWTManager(app)
+# Google OAuth Configuration (certificates and verified tokens are cached)
+google_verifier = create_google_verifier()
 
-# Google OAuth Configuration
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
+# Views are counted in memory and written in batches, then added to the authors' stats
+view_counter = create_view_counter(db, on_flush=lambda views: views_written(db, views))
 
-##############################################
-################## Utils #####################
-##############################################
+# Views, likes and comments feed a time-decayed trending ranking, written in batches
+trending_ranking = create_trending_ranking(db)
 
-# Fix the id from MongoDB
-def fix_id(obj):
-    if obj and "_id" in obj:
-        obj["_id"] = str(obj["_id"])
-    return obj
+# Password hashing runs in a bounded process pool
+password_hasher = create_password_hasher()
 
-# Fix all IDs in an array of objects
-def fix_ids(objects):
-    return [fix_id(obj) for obj in objects]
+# Requests are rate limited per client and route class, and shed when too many are in flight
+rate_limiter = create_rate_limiter()
+load_shedder = create_load_shedder()
 
-# Get user data from database
-def get_user_data(user_id):
-    user = db.users.find_one({"userId": user_id})
-    if user:
-        return {
-            "userId": user["userId"],
-            "name": user["name"],
-            "email": user.get("email"),
-            "profilePicture": user.get("profilePicture")
-        }
-    return None
+# Listing totals come from the post_counts collection (see counters.py)
+post_counts = PostCounts()
+
+# Derived fields (plain text excerpt, word count, read time, search tokens) are computed
+# in the background after a post is written, then the post is indexed with its tokens
+def content_processed(posts):
+    for post in posts:
+        search_index.index_post(post)
+    response_cache.invalidate(FEED, *[post_tag(post["_id"]) for post in posts])
+
+content_processor = create_content_processor(db, on_processed=content_processed)
 
-# Create slug from title
-def create_slug(title):
-    # Convert to lowercase and replace spaces with hyphens
-    slug = title.lower().replace(" ", "-")
-    # Remove special characters
-    slug = re.sub(r'[^a-z0-9-]', '', slug)
-    return slug
+# User profiles are cached in memory, author snapshots are refreshed in the background
+user_cache = create_user_cache()
+author_refresher = create_author_refresher(db)
+
+##############################################
+################## Utils #####################
+##############################################
 
-# Calculate read time
-def calculate_read_time(content):
-    words = len(content.split())
-    return max(1, round(words / 200))  # Assuming 200 words per minute
+# Get user data (cached, invalidated by login and register)
+def get_user_data(user_id):
+    return user_cache.get(db, user_id)
+
+# Operational endpoints (/metrics and the stats ones): when METRICS_TOKEN is set the caller
+# must send it as a bearer token. Without it they only answer local requests that didn't come
+# through a proxy (a proxy on the same host would make every client look local)
+def operator_only(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = os.getenv("METRICS_TOKEN")
+        if token:
+            if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+                return {"error": "Unauthorized"}, HTTPStatus.UNAUTHORIZED
+        elif request.remote_addr not in ("127.0.0.1", "::1") or "X-Forwarded-For" in request.headers:
+            return {"error": "Forbidden: set METRICS_TOKEN to read this endpoint remotely"}, HTTPStatus.FORBIDDEN
+        return view(*args, **kwargs)
+    return wrapper
+
+# Total of posts of a listing filter, for paginate()
+def count_posts(filter_query):
+    return post_counts.total(db, filter_query)
 
 ##############################################
 ################ ENDPOINTS ###################
 ##############################################
 
 # Home page
-@app.get("/")
+@api.get("/")
 def home():
     return "<h1>Postly API - This is my backend.</h1>", HTTPStatus.OK
 
 # Login with Google Auth
-@app.post("/api/auth/login")
+@api.post("/api/auth/login")
 def login():
     try:
         data = request.get_json()
@@ -82,7 +110,7 @@ def login():
             return {"error": "Token is required"}, HTTPStatus.BAD_REQUEST
         
         # Verify Google's token
-        idinfo = id_token.verify_oauth2_token(token, google_requests.Request(), GOOGLE_CLIENT_ID)
+        idinfo = google_verifier.verify(token)
         
         # Get user's information
         user_id = idinfo['sub']
@@ -99,11 +127,19 @@ def login():
             "lastLogin": datetime.datetime.now(datetime.UTC).isoformat()
         }
         
-        db.users.update_one(
+        from pymongo import ReturnDocument
+        previous = db.users.find_one_and_update(
             {"userId": user_id},
             {"$set": user},
-            upsert=True
+            projection={"name": 1, "email": 1, "profilePicture": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
         )
+        user_cache.invalidate(user_id)
+        
+        # Refresh the author copies in posts and comments if the profile changed
+        if previous and (previous.get("name"), previous.get("email"), previous.get("profilePicture")) != (name, email, picture):
+            author_refresher.schedule(user_id)
         
         # Generar token JWT
         access_token = create_access_token(identity=user_id)
@@ -113,7 +149,7 @@ def login():
         return {"error": str(e)}, HTTPStatus.UNAUTHORIZED
 
 # Register with email and password
-@app.post("/api/auth/register")
+@api.post("/api/auth/register")
 def register():
     try:
         data = request.get_json()
@@ -129,7 +165,7 @@ def register():
         if existing:
             return {"error": "User already exists"}, HTTPStatus.BAD_REQUEST
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = password_hasher.hash(password)
 
         new_user = {
             "userId": str(ObjectId()),
@@ -141,6 +177,7 @@ def register():
         }
 
         db.users.insert_one(new_user)
+        user_cache.invalidate(new_user["userId"])
 
         # Create JWT
         token = create_access_token(identity=new_user["userId"])
@@ -154,11 +191,13 @@ def register():
             }
         }, HTTPStatus.CREATED
 
+    except HashingBusy as e:
+        return {"error": str(e)}, HTTPStatus.SERVICE_UNAVAILABLE, {"Retry-After": "1"}
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
 # Login with email and password
-@app.post("/api/auth/login/email")
+@api.post("/api/auth/login/email")
 def login_email():
     try:
         data = request.get_json()
@@ -173,8 +212,15 @@ def login_email():
             return {"error": "Invalid credentials"}, HTTPStatus.UNAUTHORIZED
 
         # Validate password
-        if not check_password_hash(user.get("password", ""), password):
+        if not password_hasher.verify(user.get("password", ""), password):
             return {"error": "Invalid credentials"}, HTTPStatus.UNAUTHORIZED
+        
+        # Upgrade hashes made with older parameters, without making the login wait
+        if password_hasher.needs_rehash(user["password"]):
+            password_hasher.rehash_later(password, lambda new_hash: db.users.update_one(
+                {"userId": user["userId"], "password": user["password"]},
+                {"$set": {"password": new_hash}}
+            ))
 
         token = create_access_token(identity=user["userId"])
 
@@ -188,75 +234,173 @@ def login_email():
             }
         }, HTTPStatus.OK
 
+    except HashingBusy as e:
+        return {"error": str(e)}, HTTPStatus.SERVICE_UNAVAILABLE, {"Retry-After": "1"}
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
 # GET (get all posts)
-@app.get("/api/posts")
+@api.get("/api/posts")
 def get_posts():
     try:
-        # Pagination and filtered options
-        page = int(request.args.get("page", 1))
-        limit = int(request.args.get("limit", 10))
+        # Filtered options
         status = request.args.get("status", "published")
         
-        # Calculate skip for pagination
-        skip = (page - 1) * limit
+        # The first pages of the feed are served from the cache
+        cache_key = None
+        if "cursor" not in request.args and "after" not in request.args:
+            page = int(request.args.get("page", 1))
+            if page <= CACHED_PAGES:
+                cache_key = ("get_posts", status, page, int(request.args.get("limit", 10)),
+                             request.args.get("fields"), request.args.get("view", "summary"))
+                response = response_cache.get(cache_key)
+                if response is not None:
+                    return conditional_json(response, response["posts"], [response["pagination"]], dated=False)
         
         # Create filter
         filter_query = {"status": status}
         
-        # Get total posts for pagination
-        total_posts = db.posts.count_documents(filter_query)
-        
-        # Get assigned posts
-        cursor = db.posts.find(filter_query).sort("createdAt", -1).skip(skip).limit(limit)
-        posts = fix_ids(list(cursor))
+        # Get assigned posts (?cursor= for keyset pagination, ?page= for offset pagination)
+        # as summaries unless other fields are requested (?fields= or ?view=full)
+        posts, pagination = paginate(db.posts, filter_query, request.args, list_projection(request.args), count=count_posts)
         
         response = {
             "posts": posts,
-            "pagination": {
-                "total": total_posts,
-                "page": page,
-                "limit": limit,
-                "totalPages": (total_posts + limit - 1) // limit
-            }
+            "pagination": pagination
         }
         
+        if cache_key:
+            response_cache.set(cache_key, response, tags=[FEED])
+        # Clients polling the feed get a 304 while it hasn't changed
+        return conditional_json(response, posts, [pagination], dated=False)
+    except Exception as e:
+        return {"error": str(e)}, HTTPStatus.BAD_REQUEST
+
+# GET (get trending posts: most viewed, liked and commented lately, see trending.py)
+@api.get("/api/posts/trending")
+def get_trending_posts():
+    try:
+        limit = int(request.args.get("limit", 10))
+        if not 1 <= limit <= 50:
+            return {"error": "Limit must be between 1 and 50"}, HTTPStatus.BAD_REQUEST
+        
+        cache_key = ("get_trending_posts", limit, request.args.get("fields"), request.args.get("view", "summary"))
+        response = response_cache.get(cache_key)
+        if response is not None:
+            return jsonify(response), HTTPStatus.OK
+        
+        # Read more ranks than needed, some posts may be drafts or deleted
+        ranked = trending_ranking.top(limit * 2)
+        posts = {
+            post["_id"]: post
+            for post in db.posts.find({"_id": {"$in": [entry["_id"] for entry in ranked]}, "status": "published"}, list_projection(request.args))
+        }
+        results = []
+        for entry in ranked:
+            post = posts.get(entry["_id"])
+            if post and len(results) < limit:
+                post["trendingScore"] = round(trending_ranking.score(entry["rank"]), 4)
+                results.append(post)
+        
+        response = {"posts": results}
+        response_cache.set(cache_key, response, tags=[FEED, *[post_tag(post["_id"]) for post in results]])
         return jsonify(response), HTTPStatus.OK
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
+# GET (get several posts at once: ?ids=id1,id2,... or ?slugs=slug1,slug2,...)
+# One $in query, posts in the requested order, keys without a post listed in "missing".
+# Previous slugs resolve to the renamed post. Views are not counted
+@api.get("/api/posts/batch")
+def get_posts_batch():
+    try:
+        ids = [key.strip() for key in request.args.get("ids", "").split(",") if key.strip()]
+        slugs = [key.strip() for key in request.args.get("slugs", "").split(",") if key.strip()]
+        if bool(ids) == bool(slugs):
+            return {"error": "Either ids or slugs is required"}, HTTPStatus.BAD_REQUEST
+        keys = list(dict.fromkeys(ids or slugs))
+        if len(keys) > 100:
+            return {"error": "At most 100 posts can be fetched at once"}, HTTPStatus.BAD_REQUEST
+        
+        projection = list_projection(request.args)
+        if ids:
+            object_ids = [ObjectId(key) for key in keys if ObjectId.is_valid(key)]
+            found = {str(post["_id"]): post for post in db.posts.find({"_id": {"$in": object_ids}}, projection)}
+        else:
+            # The slug is needed to match the posts to the requested slugs
+            if projection is not FULL_PROJECTION:
+                projection = {**projection, "slug": 1}
+            found = {post["slug"]: post for post in db.posts.find({"slug": {"$in": keys}}, projection)}
+            # Slugs of renamed posts, one more query for each collection
+            previous = {entry["slug"]: entry["postId"] for entry in db.slug_history.find({"slug": {"$in": [key for key in keys if key not in found]}})}
+            if previous:
+                renamed = {
+                    str(post["_id"]): post
+                    for post in db.posts.find({"_id": {"$in": [ObjectId(post_id) for post_id in previous.values() if ObjectId.is_valid(post_id)]}}, projection)
+                }
+                for slug, post_id in previous.items():
+                    if post_id in renamed:
+                        found[slug] = renamed[post_id]
+        
+        posts, missing, returned = [], [], set()
+        for key in keys:
+            post = found.get(key)
+            if post is None:
+                missing.append(key)
+            elif post["_id"] not in returned:
+                returned.add(post["_id"])
+                posts.append(post)
+        
+        return conditional_json({"posts": posts, "missing": missing}, posts, [missing], dated=False)
+    except Exception as e:
+        return {"error": str(e)}, HTTPStatus.BAD_REQUEST
+
 # GET (get post by id)
-@app.get("/api/posts/<id>")
+@api.get("/api/posts/<id>")
 def get_post_by_id(id):
     try:
-        post = db.posts.find_one({"_id": ObjectId(id)})
+        post = db.posts.find_one({"_id": ObjectId(id)}, FULL_PROJECTION)
         if post:
-            # Increment views counter
-            db.posts.update_one({"_id": ObjectId(id)}, {"$inc": {"views": 1}})
-            post["views"] += 1
-            return jsonify(fix_id(post)), HTTPStatus.OK
+            # Count the view (views and trending ranks are written in the background)
+            view_counter.record(post["_id"])
+            trending_ranking.record(post["_id"], "view")
+            post["views"] = post.get("views", 0) + view_counter.pending_views(post["_id"])
+            # The view is counted even when the client's copy is current (304)
+            return conditional_json(post, [post])
         return {"error": "Post not found"}, HTTPStatus.NOT_FOUND
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
 # GET (get post by slug)
-@app.get("/api/posts/slug/<slug>")
+@api.get("/api/posts/slug/<slug>")
 def get_post_by_slug(slug):
     try:
-        post = db.posts.find_one({"slug": slug})
+        # Cached posts count the view on the cached copy as well
+        cache_key = ("get_post_by_slug", slug)
+        post = response_cache.incr(cache_key, "views")
+        if post is not None:
+            view_counter.record(post["_id"])
+            trending_ranking.record(post["_id"], "view")
+            return conditional_json(post, [post])
+        
+        # Previous slugs of a renamed post redirect to the current one. The redirect is temporary
+        # (not cached by clients): a post renamed back to an old slug would otherwise loop
+        post, moved = find_post_by_slug(db, slug)
+        if post and moved:
+            return {"slug": post["slug"], "_id": post["_id"]}, HTTPStatus.TEMPORARY_REDIRECT, {"Location": f"/api/posts/slug/{post['slug']}"}
         if post:
-            # Increment views counter
-            db.posts.update_one({"_id": post["_id"]}, {"$inc": {"views": 1}})
-            post["views"] += 1  
-            return jsonify(fix_id(post)), HTTPStatus.OK
+            # Count the view (views and trending ranks are written in the background)
+            view_counter.record(post["_id"])
+            trending_ranking.record(post["_id"], "view")
+            post["views"] = post.get("views", 0) + view_counter.pending_views(post["_id"])
+            response_cache.set(cache_key, post, tags=[post_tag(post["_id"])])
+            return conditional_json(post, [post])
         return {"error": "Post not found"}, HTTPStatus.NOT_FOUND
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
 # POST (create a new post)
-@app.post("/api/posts")
+@api.post("/api/posts")
 @jwt_required()
 def save_post():
     try:
@@ -273,45 +417,22 @@ def save_post():
         if not user_data:
             return {"error": "User not found"}, HTTPStatus.UNAUTHORIZED
         
-        # Create a slug from the title
-        slug = create_slug(post_data["title"])
-        
-        # Verify if the slug exists
-        existing_post = db.posts.find_one({"slug": slug})
-        if existing_post:
-            # Add unique suffix if it exist
-            slug = f"{slug}-{str(ObjectId())[-6:]}"
-        
-        # Calculate reading time
-        read_time = calculate_read_time(post_data["content"])
-        
-        # Create post
-        now = datetime.datetime.now(datetime.UTC).isoformat()
-        new_post = {
-            "title": post_data["title"],
-            "content": post_data["content"],
-            "author": user_data,
-            "slug": slug,
-            "createdAt": now,
-            "updatedAt": now,
-            "status": post_data.get("status", "published"),
-            "readTime": read_time,
-            "views": 0,
-            "likes": 0,
-            "comments": [],
-            # Add cover image if It is present
-            "coverImage": post_data.get("coverImage") 
-        }
+        # Create post (reading time included). The slug comes from the title,
+        # with a unique suffix if the unique index says another post has it
+        new_post = post_document(post_data, user_data, create_slug(post_data["title"]))
         
-        result = db.posts.insert_one(new_post)
-        new_post["_id"] = str(result.inserted_id)
+        insert_post(db, new_post)
+        posts_created(db, [new_post])
+        search_index.index_post(new_post)
+        content_processor.schedule(new_post["_id"])
+        response_cache.invalidate(FEED)
         
         return jsonify(new_post), HTTPStatus.CREATED
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
 # PUT (update a post)
-@app.put("/api/posts/<id>")
+@api.put("/api/posts/<id>")
 @jwt_required()
 def update_post(id):
     try:
@@ -330,17 +451,9 @@ def update_post(id):
         update_data = {}
         if "title" in data:
             update_data["title"] = data["title"]
-            # Update slug ig the title changes
-            new_slug = create_slug(data["title"])
-            
-            # Verify if the new slug already exists and It's different from the current one
-            if new_slug != post.get("slug"):
-                existing_post = db.posts.find_one({"slug": new_slug, "_id": {"$ne": ObjectId(id)}})
-                if existing_post:
-                    # Add a unique suffix if the slug already exists
-                    new_slug = f"{new_slug}-{str(ObjectId())[-6:]}"
-            
-            update_data["slug"] = new_slug
+            # Update slug if the title changes (a suffixed slug is kept while the title gives the same slug)
+            if create_slug(data["title"]) != create_slug(post["title"]):
+                update_data["slug"] = create_slug(data["title"])
             
         if "content" in data:
             update_data["content"] = data["content"]
@@ -357,59 +470,108 @@ def update_post(id):
         # Update modification date
         update_data["updatedAt"] = datetime.datetime.now(datetime.UTC).isoformat()
         
-        result = db.posts.update_one(
-            {"_id": ObjectId(id)},
-            {"$set": update_data}
-        )
+        # Fields derived from the old content are dropped until they are computed again
+        changes = {"$set": update_data}
+        if "content" in data:
+            changes["$unset"] = {field: "" for field in DERIVED_FIELDS}
+        
+        # A status change is written only if the status is still the one read, so the
+        # post counters move once even when two requests change it at the same time
+        status_change = "status" in data and data["status"] != post.get("status")
+        filter_query = {"_id": ObjectId(id)}
+        if status_change:
+            filter_query["status"] = post.get("status")
+        
+        # A slug taken by another post gets a unique suffix (see with_unique_slug)
+        write = lambda: db.posts.update_one(filter_query, changes)
+        result = with_unique_slug(update_data, write) if "slug" in update_data else write()
+        
+        if not result.matched_count and status_change and db.posts.count_documents({"_id": ObjectId(id)}, limit=1):
+            return {"error": "The post was modified at the same time, try again"}, HTTPStatus.CONFLICT
         
         if result.matched_count:
+            if status_change:
+                status_changed(db, post, data["status"])
+            
+            # The previous slug keeps working, as a redirect
+            if update_data.get("slug", post["slug"]) != post["slug"]:
+                record_previous_slug(db, post["slug"], id)
+            
             # Get the updated post to return it
-            updated_post = db.posts.find_one({"_id": ObjectId(id)})
-            return jsonify(fix_id(updated_post)), HTTPStatus.OK
+            updated_post = db.posts.find_one({"_id": ObjectId(id)}, FULL_PROJECTION)
+            search_index.index_post(updated_post)
+            response_cache.invalidate(FEED, post_tag(id))
+            if "content" in data:
+                content_processor.schedule(updated_post["_id"])
+            return jsonify(updated_post), HTTPStatus.OK
             
         return {"error": "Post not found"}, HTTPStatus.NOT_FOUND
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
 # DELETE (delete a post)
-@app.delete("/api/posts/<id>")
+@api.delete("/api/posts/<id>")
 @jwt_required()
 def delete_post(id):
     try:
         user_id = get_jwt_identity()
         
-        # Check if the post exists and belongs to the user
-        post = db.posts.find_one({"_id": ObjectId(id)})
-        if not post:
-            return {"error": "Post not found"}, HTTPStatus.NOT_FOUND
-            
-        if post["author"]["userId"] != user_id:
-            return {"error": "Unauthorized: you can only delete your own posts"}, HTTPStatus.UNAUTHORIZED
-        
-        result = db.posts.delete_one({"_id": ObjectId(id)})
-        if result.deleted_count:
+        # Delete the post if it belongs to the user. The counters are decremented from the
+        # deleted document itself, so a status change made meanwhile can't skew them
+        post = db.posts.find_one_and_delete({"_id": ObjectId(id), "author.userId": user_id})
+        if post:
+            post_deleted(db, post)
             # Also remove associated likes
             db.post_likes.delete_many({"postId": id})
+            db.comments.delete_many({"postId": id})
+            db.slug_history.delete_many({"postId": id})
+            trending_ranking.remove(ObjectId(id))
+            search_index.remove(id)
+            response_cache.invalidate(FEED, post_tag(id), comments_tag(id))
             return {"message": "Post deleted successfully"}, HTTPStatus.OK
+        
+        # Nothing deleted: someone else's post, or no post at all
+        if db.posts.find_one({"_id": ObjectId(id)}, {"_id": 1}):
+            return {"error": "Unauthorized: you can only delete your own posts"}, HTTPStatus.UNAUTHORIZED
         return {"error": "Post not found"}, HTTPStatus.NOT_FOUND
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
-# GET (get comments for a post)
-@app.get("/api/posts/<post_id>/comments")
+# GET (get comments for a post, oldest first)
+@api.get("/api/posts/<post_id>/comments")
 def get_comments(post_id):
     try:
-        post = db.posts.find_one({"_id": ObjectId(post_id)})
-        if not post:
+        # Only the first page of comments is cached
+        first_page = not (request.args.get("cursor") or request.args.get("after")) and int(request.args.get("page", 1)) == 1
+        cache_key = ("get_comments", post_id, int(request.args.get("limit", 20)))
+        if first_page:
+            response = response_cache.get(cache_key)
+            if response is not None:
+                return jsonify(response), HTTPStatus.OK
+        
+        # Get paginated comments (?cursor= for the next pages)
+        comments, pagination = paginate(
+            db.comments, {"postId": post_id}, request.args,
+            direction=OLDEST_FIRST, count=False, default_limit=20
+        )
+        
+        # A post without comments may not exist at all
+        if first_page and not comments and not db.posts.find_one({"_id": ObjectId(post_id)}, {"_id": 1}):
             return {"error": "Post not found"}, HTTPStatus.NOT_FOUND
         
-        comments = post.get("comments", [])
-        return jsonify(comments), HTTPStatus.OK
+        response = {
+            "comments": comments,
+            "pagination": pagination
+        }
+        
+        if first_page:
+            response_cache.set(cache_key, response, tags=[comments_tag(post_id)])
+        return jsonify(response), HTTPStatus.OK
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
 # POST (create a comment for a post)
-@app.post("/api/posts/<post_id>/comments")
+@api.post("/api/posts/<post_id>/comments")
 @jwt_required()
 def create_comment(post_id):
     try:
@@ -426,113 +588,122 @@ def create_comment(post_id):
         if not user_data:
             return {"error": "User not found"}, HTTPStatus.UNAUTHORIZED
         
-        # Create the comment
-        comment = {
-            "_id": str(ObjectId()),  # Generar ID único para el comentario
-            "content": comment_data["content"],
-            "author": {
-                "userId": user_data["userId"],
-                "name": user_data["name"],
-                "profilePicture": user_data.get("profilePicture")
-            },
-            "createdAt": datetime.datetime.now(datetime.UTC).isoformat(),
-            "likes": 0
-        }
-        
-        # Add the comment to the post
-        result = db.posts.update_one(
+        # Count the comment on the post (this also verifies that the post exists)
+        post = db.posts.find_one_and_update(
             {"_id": ObjectId(post_id)},
-            {"$push": {"comments": comment}}
+            {"$inc": {"commentCount": 1}},
+            projection={"author.userId": 1}
         )
+        if not post:
+            return {"error": "Post not found"}, HTTPStatus.NOT_FOUND
+        author_activity(db, {post["author"]["userId"]: {"comments": 1}})
         
-        if result.matched_count:
-            return jsonify(comment), HTTPStatus.CREATED
-        return {"error": "Post not found"}, HTTPStatus.NOT_FOUND
+        # Create the comment
+        comment = comment_document(post_id, comment_data["content"], user_data)
+        db.comments.insert_one(comment)
+        trending_ranking.record(ObjectId(post_id), "comment")
+        
+        response_cache.invalidate(FEED, post_tag(post_id), comments_tag(post_id))
+        return jsonify(comment), HTTPStatus.CREATED
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
 # DELETE (delete a comment from a post)
-@app.delete("/api/posts/<post_id>/comments/<comment_id>")
+@api.delete("/api/posts/<post_id>/comments/<comment_id>")
 @jwt_required()
 def delete_comment(post_id, comment_id):
     try:
         user_id = get_jwt_identity()
         
-        # Verify if the comment exists
-        post = db.posts.find_one({"_id": ObjectId(post_id)})
-        if not post:
-            return {"error": "Post not found"}, HTTPStatus.NOT_FOUND
-        
         # Find the comment
-        comment = next((c for c in post.get("comments", []) if c["_id"] == comment_id), None)
+        comment = None
+        if ObjectId.is_valid(comment_id):
+            comment = db.comments.find_one({"_id": ObjectId(comment_id), "postId": post_id})
         if not comment:
             return {"error": "Comment not found"}, HTTPStatus.NOT_FOUND
         
         # Check permissions: only the comment author or the post author can delete it
-        if comment["author"]["userId"] != user_id and post["author"]["userId"] != user_id:
-            return {"error": "Unauthorized: you can only delete your own comments"}, HTTPStatus.UNAUTHORIZED
+        if comment["author"]["userId"] != user_id:
+            post = db.posts.find_one({"_id": ObjectId(post_id)}, {"author.userId": 1})
+            if not post or post["author"]["userId"] != user_id:
+                return {"error": "Unauthorized: you can only delete your own comments"}, HTTPStatus.UNAUTHORIZED
         
         # Delete the comment
-        result = db.posts.update_one(
-            {"_id": ObjectId(post_id)},
-            {"$pull": {"comments": {"_id": comment_id}}}
-        )
+        result = db.comments.delete_one({"_id": comment["_id"]})
         
-        if result.modified_count:
+        if result.deleted_count:
+            post = db.posts.find_one_and_update(
+                {"_id": ObjectId(post_id)},
+                {"$inc": {"commentCount": -1}},
+                projection={"author.userId": 1}
+            )
+            if post:
+                author_activity(db, {post["author"]["userId"]: {"comments": -1}})
+            response_cache.invalidate(FEED, post_tag(post_id), comments_tag(post_id))
             return {"message": "Comment deleted successfully"}, HTTPStatus.OK
         return {"error": "Comment not found"}, HTTPStatus.NOT_FOUND
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
 # Endpoint to like a post
-@app.post("/api/posts/<post_id>/like")
+@api.post("/api/posts/<post_id>/like")
 @jwt_required()
 def like_post(post_id):
     try:
         user_id = get_jwt_identity()
+        post_object_id = ObjectId(post_id)
+        
+        # Add the like if it doesn't already exist (the unique {postId, userId} index makes it idempotent)
+        from pymongo.errors import DuplicateKeyError
+        try:
+            result = db.post_likes.update_one(
+                {"postId": post_id, "userId": user_id},
+                {"$setOnInsert": {"createdAt": datetime.datetime.now(datetime.UTC).isoformat()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # A concurrent request inserted the same like first
+            return {"message": "Post already liked"}, HTTPStatus.OK
+        
+        if result.upserted_id is None:
+            return {"message": "Post already liked"}, HTTPStatus.OK
         
-        # Verify if the post exists
-        post = db.posts.find_one({"_id": ObjectId(post_id)})
+        # Increment likes counter only for a new like (this also verifies that the post exists)
+        post = db.posts.find_one_and_update(
+            {"_id": post_object_id},
+            {"$inc": {"likes": 1}},
+            projection={"author.userId": 1}
+        )
         if not post:
+            db.post_likes.delete_one({"postId": post_id, "userId": user_id})
             return {"error": "Post not found"}, HTTPStatus.NOT_FOUND
+        author_activity(db, {post["author"]["userId"]: {"likes": 1}})
+        trending_ranking.record(post_object_id, "like")
+        response_cache.invalidate(FEED, post_tag(post_id))
         
-        # Add the like and user to the likes list (if it doesn't already exist)
-        if not db.post_likes.find_one({"postId": post_id, "userId": user_id}):
-            db.post_likes.insert_one({
-                "postId": post_id,
-                "userId": user_id,
-                "createdAt": datetime.datetime.now(datetime.UTC).isoformat()
-            })
-            
-            # Increment likes counter
-            db.posts.update_one(
-                {"_id": ObjectId(post_id)},
-                {"$inc": {"likes": 1}}
-            )
-            
-            return {"message": "Post liked successfully"}, HTTPStatus.OK
-        else:
-            return {"message": "Post already liked"}, HTTPStatus.OK
+        return {"message": "Post liked successfully"}, HTTPStatus.OK
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
 # Endpoint to remove like from a post
-@app.delete("/api/posts/<post_id>/like")
+@api.delete("/api/posts/<post_id>/like")
 @jwt_required()
 def unlike_post(post_id):
     try:
         user_id = get_jwt_identity()
         
-        # Verify if the like exists
-        if db.post_likes.find_one({"postId": post_id, "userId": user_id}):
-            # Eliminar el like
-            db.post_likes.delete_one({"postId": post_id, "userId": user_id})
-            
+        # Delete the like, the counter only changes if there was one
+        result = db.post_likes.delete_one({"postId": post_id, "userId": user_id})
+        if result.deleted_count:
             # Decrease like counter
-            db.posts.update_one(
+            post = db.posts.find_one_and_update(
                 {"_id": ObjectId(post_id)},
-                {"$inc": {"likes": -1}}
+                {"$inc": {"likes": -1}},
+                projection={"author.userId": 1}
             )
+            if post:
+                author_activity(db, {post["author"]["userId"]: {"likes": -1}})
+            response_cache.invalidate(FEED, post_tag(post_id))
             
             return {"message": "Post unliked successfully"}, HTTPStatus.OK
         else:
@@ -541,7 +712,7 @@ def unlike_post(post_id):
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
 # Endpoint to check if a user liked a post
-@app.get("/api/posts/<post_id>/like")
+@api.get("/api/posts/<post_id>/like")
 @jwt_required()
 def check_like(post_id):
     try:
@@ -554,107 +725,177 @@ def check_like(post_id):
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
+# Endpoint to check which posts of a page the user liked (?ids=id1,id2,...)
+@api.get("/api/posts/likes")
+@jwt_required()
+def check_likes():
+    try:
+        user_id = get_jwt_identity()
+        
+        post_ids = [post_id.strip() for post_id in request.args.get("ids", "").split(",") if post_id.strip()]
+        if not post_ids:
+            return {"error": "ids is required"}, HTTPStatus.BAD_REQUEST
+        if len(post_ids) > 100:
+            return {"error": "At most 100 ids can be checked at once"}, HTTPStatus.BAD_REQUEST
+        
+        # One query for the whole page
+        likes = db.post_likes.find({"userId": user_id, "postId": {"$in": post_ids}}, {"postId": 1, "_id": 0})
+        liked = {like["postId"] for like in likes}
+        
+        return {"liked": {post_id: post_id in liked for post_id in post_ids}}, HTTPStatus.OK
+    except Exception as e:
+        return {"error": str(e)}, HTTPStatus.BAD_REQUEST
+
 # Endpoint to find posts
-@app.get("/api/posts/search")
+@api.get("/api/posts/search")
 def search_posts():
     try:
-        query = request.args.get("q", "")
+        query = request.args.get("q", "").strip()
         if not query:
             return {"error": "Search query is required"}, HTTPStatus.BAD_REQUEST
         
-        # Search in title and content
-        cursor = db.posts.find({
-            "$or": [
-                {"title": {"$regex": query, "$options": "i"}},
-                {"content": {"$regex": query, "$options": "i"}}
-            ],
-            "status": "published"  # Only search published posts
-        }).sort("createdAt", -1)
-        
-        results = fix_ids(list(cursor))
-        return jsonify(results), HTTPStatus.OK
+        # Pagination options
+        page = int(request.args.get("page", 1))
+        limit = int(request.args.get("limit", 10))
+        if page < 1 or limit < 1:
+            return {"error": "Page and limit must be positive integers"}, HTTPStatus.BAD_REQUEST
+        
+        # Rank published posts by relevance (BM25 over title and content)
+        results, total_results = search_page(db, search_index, query, page, limit, list_projection(request.args))
+        
+        response = {
+            "posts": results,
+            "pagination": {
+                "total": total_results,
+                "page": page,
+                "limit": limit,
+                "totalPages": (total_results + limit - 1) // limit
+            }
+        }
+        
+        return jsonify(response), HTTPStatus.OK
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
 # Endpoint to get posts from a specific user
-@app.get("/api/users/<user_id>/posts")
+@api.get("/api/users/<user_id>/posts")
 def get_user_posts(user_id):
     try:
-        # Filtering and pagination options
-        page = int(request.args.get("page", 1))
-        limit = int(request.args.get("limit", 10))
+        # Filtering options
         status = request.args.get("status", "published")
         
-        # Calculate skip for pagination
-        skip = (page - 1) * limit
-        
         # Create filter
         filter_query = {"author.userId": user_id, "status": status}
         
-        # Get total posts for pagination
-        total_posts = db.posts.count_documents(filter_query)
-        
         # Get paginated posts
-        cursor = db.posts.find(filter_query).sort("createdAt", -1).skip(skip).limit(limit)
-        posts = fix_ids(list(cursor))
+        posts, pagination = paginate(db.posts, filter_query, request.args, list_projection(request.args), count=count_posts)
         
         response = {
             "posts": posts,
-            "pagination": {
-                "total": total_posts,
-                "page": page,
-                "limit": limit,
-                "totalPages": (total_posts + limit - 1) // limit
-            }
+            "pagination": pagination
         }
         
-        return jsonify(response), HTTPStatus.OK
+        return conditional_json(response, posts, [pagination], dated=False)
+    except Exception as e:
+        return {"error": str(e)}, HTTPStatus.BAD_REQUEST
+
+# Endpoint to get an author's totals for the profile page: posts per status, views, likes
+# and comments of their posts. Read from rollups kept up to date as these change (counters.py)
+@api.get("/api/users/<user_id>/stats")
+def get_user_stats(user_id):
+    try:
+        return jsonify(post_counts.author_stats(db, user_id)), HTTPStatus.OK
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
 # Endpoint to get posts from the authenticated user (including drafts)
-@app.get("/api/users/me/posts")
+@api.get("/api/users/me/posts")
 @jwt_required()
 def get_my_posts():
     try:
         user_id = get_jwt_identity()
         
-        # Filtering and pagination options
-        page = int(request.args.get("page", 1))
-        limit = int(request.args.get("limit", 10))
+        # Filtering options
         status = request.args.get("status", None)  # Opcional: filtrar por estado
         
-        # Calculate skip for pagination
-        skip = (page - 1) * limit
-        
         # Create filter
         filter_query = {"author.userId": user_id}
         if status:
             filter_query["status"] = status
         
-        # Get total posts for pagination
-        total_posts = db.posts.count_documents(filter_query)
-        
         # Get paginated posts
-        cursor = db.posts.find(filter_query).sort("createdAt", -1).skip(skip).limit(limit)
-        posts = fix_ids(list(cursor))
+        posts, pagination = paginate(db.posts, filter_query, request.args, list_projection(request.args), count=count_posts)
         
         response = {
             "posts": posts,
-            "pagination": {
-                "total": total_posts,
-                "page": page,
-                "limit": limit,
-                "totalPages": (total_posts + limit - 1) // limit
-            }
+            "pagination": pagination
         }
         
-        return jsonify(response), HTTPStatus.OK
+        return conditional_json(response, posts, [pagination], dated=False)
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.BAD_REQUEST
 
+# Endpoint to export the posts of the authenticated user as NDJSON (one post per line, streamed)
+@api.get("/api/users/me/posts/export")
+@jwt_required()
+def export_my_posts():
+    user_id = get_jwt_identity()
+    lines = export_posts(db, {"author.userId": user_id}, sort=[("createdAt", -1), ("_id", -1)])
+    return Response(
+        stream_with_context(lines),
+        mimetype="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=posts.ndjson"}
+    )
+
+# Endpoint to import posts for the authenticated user from NDJSON (one post per line,
+# title and content required). Written in chunks, errors are reported by line number
+@api.post("/api/posts/import")
+@jwt_required()
+def import_my_posts():
+    try:
+        user_data = get_user_data(get_jwt_identity())
+        if not user_data:
+            return {"error": "User not found"}, HTTPStatus.UNAUTHORIZED
+        
+        def index_chunk(documents):
+            for post in documents:
+                search_index.index_post(post)
+                content_processor.schedule(post["_id"])
+        
+        result = import_posts(db, read_ndjson(request.stream), author=user_data, on_chunk=index_chunk)
+        if result["imported"]:
+            response_cache.invalidate(FEED)
+        return result, HTTPStatus.CREATED if result["imported"] else HTTPStatus.BAD_REQUEST
+    except Exception as e:
+        return {"error": str(e)}, HTTPStatus.BAD_REQUEST
+
+# Endpoint to get the response cache counters (to size the cache)
+@api.get("/api/cache/stats")
+@operator_only
+def cache_stats():
+    return jsonify(response_cache.stats()), HTTPStatus.OK
+
+# Endpoint for Prometheus (per-route latency, status counts, MongoDB commands per request).
+# When METRICS_TOKEN is set the scraper must send it as a bearer token, local requests only otherwise
+@api.get("/metrics")
+@operator_only
+def get_metrics():
+    return metrics.render(), HTTPStatus.OK, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+# Endpoint to get the password hashing timings and queue state
+@api.get("/api/auth/hashing/stats")
+@operator_only
+def hashing_stats():
+    return jsonify(password_hasher.stats()), HTTPStatus.OK
+
+# Endpoint to get the requests in flight per route class and the shedding limits
+@api.get("/api/admission/stats")
+@operator_only
+def admission_stats():
+    return jsonify(load_shedder.stats() if load_shedder else {}), HTTPStatus.OK
+
 # Endpoint to check authentication status
-@app.get("/api/auth/check")
+@api.get("/api/auth/check")
 @jwt_required()
 def check_auth():
     try:
@@ -667,11 +908,49 @@ def check_auth():
     except Exception as e:
         return {"error": str(e)}, HTTPStatus.UNAUTHORIZED
 
+##############################################
+################ APP FACTORY #################
+##############################################
+
+def create_app():
+    app = Flask(__name__)
+    CORS(app)  # Warning: this enables CORS for all origins
+    
+    # JWT Configuration
+    app.config['JWT_SECRET_KEY'] = os.getenv("JWT_SECRET_KEY", "your-secret-key")
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = datetime.timedelta(days=7)
+    JWTManager(app)
+    
+    # ObjectIds and dates are serialized by the JSON provider (orjson when installed)
+    app.json = MongoJSONProvider(app)
+    
+    # Per-route latency, status counts and MongoDB commands, exposed on /metrics
+    install_metrics(app, metrics)
+    
+    # Rate limits (429) and load shedding (503), rejected requests are counted on /metrics
+    install_admission(app, rate_limiter, load_shedder, metrics)
+    
+    # gzip/brotli for the bigger responses (conditional GETs are answered by the endpoints)
+    install_compression(app)
+    
+    app.register_blueprint(api)
+    return app
+
+# Used by the dev server and by gunicorn (gunicorn server:app, see gunicorn.conf.py)
+app = create_app()
+
 ##############################################
 ################# RUN SERVER #################
 ##############################################
 
 if __name__ == "__main__":
+    # Create the indexes the endpoints rely on and make sure every query uses them
+    from indexes import bootstrap_indexes
+    bootstrap_indexes(db)
+    # Build the post counters of an existing database once
+    from counters import ensure_counts
+    ensure_counts(db)
+    
     app.run(
         host=(os.getenv("HOST", "127.0.0.1")), 
         port=int(os.getenv("PORT", 5000)), 
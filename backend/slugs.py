@@ -0,0 +1,89 @@
+# Libraries
+import datetime, re, sys
+from bson.objectid import ObjectId
+from projection import FULL_PROJECTION
+
+# Suffixed slugs tried when the unique index rejects a slug
+MAX_SLUG_ATTEMPTS = 5
+
+# Create slug from title
+def create_slug(title):
+    # Convert to lowercase and replace spaces with hyphens
+    slug = title.lower().replace(" ", "-")
+    # Remove special characters
+    slug = re.sub(r'[^a-z0-9-]', '', slug)
+    return slug
+
+# Slug with a unique suffix, for titles whose slug is taken
+def suffixed_slug(slug):
+    return f"{slug}-{str(ObjectId())[-6:]}"
+
+# Whether a duplicate key error (its details, or a bulk write error entry) comes from the slug index
+def is_slug_conflict(details):
+    details = details or {}
+    return "slug" in (details.get("keyPattern") or {}) or "slug" in details.get("errmsg", "")
+
+# Run a write that sets fields["slug"]. When the unique index says the slug is taken,
+# retry with a suffixed slug: the index decides, so two requests can't get the same slug
+def with_unique_slug(fields, write):
+    from pymongo.errors import DuplicateKeyError
+    base = fields["slug"]
+    for _ in range(MAX_SLUG_ATTEMPTS):
+        try:
+            return write()
+        except DuplicateKeyError as e:
+            if not is_slug_conflict(e.details):
+                raise
+            fields["slug"] = suffixed_slug(base)
+    raise ValueError(f"Could not find a free slug for {base}")
+
+# Insert a post, suffixing its slug if another post has it
+def insert_post(db, post):
+    with_unique_slug(post, lambda: db.posts.insert_one(post))
+    return post
+
+# Keep the previous slug of a renamed post, so old links can be redirected
+def record_previous_slug(db, slug, post_id):
+    db.slug_history.update_one(
+        {"slug": slug},
+        {"$set": {"postId": str(post_id), "createdAt": datetime.datetime.now(datetime.UTC).isoformat()}},
+        upsert=True
+    )
+
+# The post known by this slug and whether the slug is a previous one (redirect).
+# Current slugs take one lookup on the unique slug index, previous ones go through slug_history
+def find_post_by_slug(db, slug):
+    post = db.posts.find_one({"slug": slug}, FULL_PROJECTION)
+    if post:
+        return post, False
+    entry = db.slug_history.find_one({"slug": slug})
+    if not entry or not ObjectId.is_valid(entry["postId"]):
+        return None, False
+    post = db.posts.find_one({"_id": ObjectId(entry["postId"])}, FULL_PROJECTION)
+    if not post:
+        return None, False
+    return post, post["slug"] != slug
+
+# Give a suffixed slug to every post sharing its slug with an older post,
+# so the unique slug index can be created on an existing database
+def dedupe_slugs(db):
+    renamed = 0
+    duplicates = db.posts.aggregate([
+        {"$group": {"_id": "$slug", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ])
+    for duplicate in duplicates:
+        posts = list(db.posts.find({"slug": duplicate["_id"]}, {"_id": 1}).sort([("createdAt", 1), ("_id", 1)]))
+        for post in posts[1:]:
+            db.posts.update_one({"_id": post["_id"]}, {"$set": {"slug": suffixed_slug(duplicate["_id"])}})
+            renamed += 1
+    return renamed
+
+# Usage: python slugs.py dedupe
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "dedupe":
+        print("Usage: python slugs.py dedupe")
+        sys.exit(1)
+
+    from config import db
+    print(f"Renamed {dedupe_slugs(db)} posts")
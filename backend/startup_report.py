@@ -0,0 +1,67 @@
+# Startup-time report: imports the app in a fresh interpreter with `python -X importtime`
+# and prints where the boot time goes, as JSON.
+#
+# Usage: python startup_report.py [--module server] [--top 15] [--max-ms 500]
+# With --max-ms the command exits with an error when the import takes longer (for CI).
+import argparse, json, os, subprocess, sys
+
+# Import the module and build nothing else; print the wall time in seconds on stdout
+PROBE = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+# Parse the `import time: self | cumulative | name` lines written to stderr
+def parse_importtime(output):
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append({
+            "module": name.strip(),
+            "depth": depth,
+            "selfMs": int(self_us) / 1000,
+            "cumulativeMs": int(cumulative_us) / 1000
+        })
+    return modules
+
+def startup_report(module="server", top=15):
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        cwd=here, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    modules = parse_importtime(result.stderr)
+    index = max(i for i, entry in enumerate(modules) if entry["module"] == module)
+    root = modules[index]
+
+    # Children are listed right before their parent, one level deeper
+    direct = []
+    for entry in reversed(modules[:index]):
+        if entry["depth"] <= root["depth"]:
+            break
+        if entry["depth"] == root["depth"] + 1:
+            direct.append(entry)
+
+    return {
+        "module": module,
+        "importMs": round(float(result.stdout.strip().splitlines()[-1]) * 1000, 2),
+        "modulesImported": len(modules),
+        "directImports": sorted(direct, key=lambda entry: -entry["cumulativeMs"])[:top],
+        "slowestModules": sorted(modules, key=lambda entry: -entry["selfMs"])[:top]
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the import time of the app")
+    parser.add_argument("--module", default="server")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float)
+    args = parser.parse_args()
+
+    report = startup_report(args.module, args.top)
+    print(json.dumps(report, indent=2))
+    if args.max_ms is not None and report["importMs"] > args.max_ms:
+        print(f"Import took {report['importMs']} ms, more than {args.max_ms} ms", file=sys.stderr)
+        sys.exit(1)
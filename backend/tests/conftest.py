@@ -0,0 +1,5 @@
+# Libraries
+import os, sys
+
+# The backend modules are imported by name, as server.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,118 @@
+# Libraries
+import json, threading, time, types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import rsa
+from google.auth import crypt, jwt
+import google_auth
+from google_auth import GoogleTokenVerifier, MIN_REFRESH_INTERVAL
+
+CLIENT_ID = "postly-test.apps.googleusercontent.com"
+MAX_AGE = 3600
+
+# Key pairs the tokens are signed with, keyed by key id. The endpoint serves the public
+# keys as PEM, which google.auth verifies the same way as Google's X.509 certificates
+@pytest.fixture(scope="module")
+def keys():
+    pairs = {}
+    for key_id in ("key-1", "key-2"):
+        public_key, private_key = rsa.newkeys(1024)
+        pairs[key_id] = (public_key.save_pkcs1().decode(), private_key.save_pkcs1().decode())
+    return pairs
+
+# Local stand-in for Google's certificate endpoint, counting the fetches
+@pytest.fixture
+def certs_server(keys):
+    state = {"key_ids": ["key-1"], "fetches": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state["fetches"] += 1
+            body = json.dumps({key_id: keys[key_id][0] for key_id in state["key_ids"]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Cache-Control", f"public, max-age={MAX_AGE}, must-revalidate, no-transform")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["url"] = f"http://127.0.0.1:{server.server_address[1]}/certs"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+# Clock of the certificate cache, moved by the tests instead of sleeping
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"value": 1000.0}
+    monkeypatch.setattr(google_auth, "time", types.SimpleNamespace(monotonic=lambda: now["value"], time=time.time))
+    return now
+
+@pytest.fixture
+def verifier(certs_server, clock):
+    return GoogleTokenVerifier(CLIENT_ID, certs_url=certs_server["url"])
+
+# ID token signed with one of the keys, every call gives a different token (no claims cache hit)
+def make_token(keys, key_id="key-1", **claims):
+    now = int(time.time())
+    payload = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": f"user-{time.perf_counter_ns()}",
+        "email": "ana@example.com",
+        "iat": now,
+        "exp": now + 3600,
+        **claims
+    }
+    signer = crypt.RSASigner.from_string(keys[key_id][1], key_id)
+    return jwt.encode(signer, payload).decode()
+
+def test_certs_fetched_once_per_max_age(keys, certs_server, clock, verifier):
+    for _ in range(3):
+        assert verifier.verify(make_token(keys))["aud"] == CLIENT_ID
+    assert certs_server["fetches"] == 1
+
+    clock["value"] += MAX_AGE - 1
+    verifier.verify(make_token(keys))
+    assert certs_server["fetches"] == 1
+
+    clock["value"] += 1
+    verifier.verify(make_token(keys))
+    assert certs_server["fetches"] == 2
+
+def test_unknown_key_id_refetches_certs(keys, certs_server, clock, verifier):
+    verifier.verify(make_token(keys))
+    assert certs_server["fetches"] == 1
+
+    # Google rotates its keys: a token signed with the new key triggers a refetch
+    certs_server["key_ids"] = ["key-1", "key-2"]
+    clock["value"] += MIN_REFRESH_INTERVAL
+    assert verifier.verify(make_token(keys, "key-2"))["aud"] == CLIENT_ID
+    assert certs_server["fetches"] == 2
+
+def test_unknown_key_id_refetch_is_rate_limited(keys, certs_server, clock, verifier):
+    verifier.verify(make_token(keys))
+    certs_server["key_ids"] = ["key-1", "key-2"]
+    clock["value"] += MIN_REFRESH_INTERVAL - 1
+    with pytest.raises(ValueError):
+        verifier.verify(make_token(keys, "key-2"))
+    assert certs_server["fetches"] == 1
+
+def test_wrong_audience_rejected(keys, verifier):
+    with pytest.raises(ValueError):
+        verifier.verify(make_token(keys, aud="someone-else.apps.googleusercontent.com"))
+
+def test_wrong_issuer_rejected(keys, verifier):
+    with pytest.raises(ValueError, match="Wrong issuer"):
+        verifier.verify(make_token(keys, iss="https://evil.example.com"))
+
+def test_token_signed_with_unknown_key_rejected(keys, certs_server, verifier):
+    certs_server["key_ids"] = ["key-2"]
+    with pytest.raises(ValueError):
+        verifier.verify(make_token(keys, "key-1"))
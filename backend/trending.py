@@ -0,0 +1,105 @@
+# Libraries
+import atexit, math, os, threading, time
+from workers import BackgroundWorker
+
+# Weight of each kind of event in the trending score
+EVENT_WEIGHTS = {"view": 1.0, "like": 3.0, "comment": 5.0}
+# Rank of a post without events (the log of a zero score)
+NO_RANK = -1e9
+# Posts whose score decayed below this are dropped from the collection
+MIN_SCORE = 0.01
+# Seconds between two prunes
+PRUNE_INTERVAL = 3600
+
+# log(e^a + e^b) without overflowing
+def logaddexp(a, b):
+    high = max(a, b)
+    return high + math.log1p(math.exp(min(a, b) - high))
+
+# The same computation as an aggregation expression, adding to the stored rank
+def logaddexp_expression(rank):
+    current = {"$ifNull": ["$rank", NO_RANK]}
+    high = {"$max": [current, rank]}
+    return {"$add": [high, {"$ln": {"$add": [1, {"$exp": {"$subtract": [{"$min": [current, rank]}, high]}}]}}]}
+
+# Time-decayed popularity of posts fed by view, like and comment events.
+# A post's score is the sum of its event weights, each halved every half life. It is
+# stored as rank = ln(sum of weight * e^(decay * event time)): decay scales every score
+# by the same factor, so ranks never need to be recomputed and the trending collection
+# can be read with an index on rank. The current score is e^(rank - decay * now).
+# Events are merged in memory and written periodically, like the view counter.
+class TrendingRanking(BackgroundWorker):
+    name = "trending-ranking"
+    description = "Trending flush"
+
+    def __init__(self, db, half_life_hours=24.0, interval=5.0, batch_size=500):
+        super().__init__(interval)
+        self.db = db
+        self.decay = math.log(2) / (half_life_hours * 3600)
+        self.batch_size = batch_size
+        self.pending = {}  # post _id -> rank of the events not written yet
+        self.last_prune = time.time()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+
+    # Count an event ("view", "like" or "comment"). Never touches the database on the request path
+    def record(self, post_id, event, at=None):
+        rank = math.log(EVENT_WEIGHTS[event]) + self.decay * (at or time.time())
+        with self.lock:
+            self.pending[post_id] = logaddexp(self.pending.get(post_id, NO_RANK), rank)
+            full = len(self.pending) >= self.batch_size
+        self.start()
+        if full:
+            self.wake.set()
+
+    # Current score of a rank
+    def score(self, rank, now=None):
+        return math.exp(rank - self.decay * (now or time.time()))
+
+    # Ranks of the most trending posts, highest first
+    def top(self, limit):
+        return list(self.db.trending.find({}, {"rank": 1}).sort("rank", -1).limit(limit))
+
+    def remove(self, post_id):
+        with self.lock:
+            self.pending.pop(post_id, None)
+        self.db.trending.delete_one({"_id": post_id})
+
+    # Add the pending ranks to the stored ones in one unordered bulk_write
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+            if batch:
+                from pymongo import UpdateOne
+                try:
+                    self.db.trending.bulk_write([
+                        UpdateOne({"_id": post_id}, [{"$set": {"rank": logaddexp_expression(rank)}}], upsert=True)
+                        for post_id, rank in batch.items()
+                    ], ordered=False)
+                except Exception:
+                    # Merge the events back so the next flush retries them
+                    with self.lock:
+                        for post_id, rank in batch.items():
+                            self.pending[post_id] = logaddexp(self.pending.get(post_id, NO_RANK), rank)
+                    raise
+            self.prune()
+            return len(batch)
+
+    # Drop the posts nobody interacted with for a long time
+    def prune(self):
+        now = time.time()
+        if now - self.last_prune < PRUNE_INTERVAL:
+            return
+        self.last_prune = now
+        self.db.trending.delete_many({"rank": {"$lt": math.log(MIN_SCORE) + self.decay * now}})
+
+def create_trending_ranking(db):
+    ranking = TrendingRanking(
+        db,
+        half_life_hours=float(os.getenv("TRENDING_HALF_LIFE_HOURS", 24)),
+        interval=float(os.getenv("TRENDING_FLUSH_INTERVAL", 5))
+    )
+    # Write the remaining events on shutdown
+    atexit.register(ranking.stop)
+    return ranking
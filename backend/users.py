@@ -0,0 +1,122 @@
+# Libraries
+import atexit, os, sys, threading
+from cachetools import TTLCache
+from cache import response_cache, FEED
+from workers import BackgroundWorker
+
+# Fields of a user that are copied into posts (author) and comments (author)
+POST_AUTHOR_FIELDS = ["name", "email", "profilePicture"]
+COMMENT_AUTHOR_FIELDS = ["name", "profilePicture"]
+
+# Public profile of a user document
+def user_data(user):
+    return {
+        "userId": user["userId"],
+        "name": user["name"],
+        "email": user.get("email"),
+        "profilePicture": user.get("profilePicture")
+    }
+
+# In-process cache of user profiles keyed by userId.
+# login and register invalidate it; the TTL bounds how long another process' changes stay hidden.
+class UserCache:
+    def __init__(self, maxsize=10000, ttl=300):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+
+    def get(self, db, user_id):
+        with self.lock:
+            cached = self.entries.get(user_id)
+        if cached is not None:
+            return dict(cached)
+
+        user = db.users.find_one({"userId": user_id}, {"userId": 1, "name": 1, "email": 1, "profilePicture": 1})
+        if not user:
+            return None
+        data = user_data(user)
+        with self.lock:
+            self.entries[user_id] = data
+        return dict(data)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+# Update operations that copy a user's current profile into the posts and comments they authored.
+# Documents that already carry the current snapshot are not touched.
+def snapshot_updates(user, fields):
+    from pymongo import UpdateMany
+    stale = [{f"author.{field}": {"$ne": user.get(field)}} for field in fields]
+    return UpdateMany(
+        {"author.userId": user["userId"], "$or": stale},
+        {"$set": {f"author.{field}": user.get(field) for field in fields}}
+    )
+
+# Push the current profile of the given users into their posts and comments with batched update_many
+def refresh_author_snapshots(db, users):
+    if not users:
+        return 0
+    posts = db.posts.bulk_write([snapshot_updates(user, POST_AUTHOR_FIELDS) for user in users], ordered=False)
+    comments = db.comments.bulk_write([snapshot_updates(user, COMMENT_AUTHOR_FIELDS) for user in users], ordered=False)
+    modified = posts.modified_count + comments.modified_count
+    if modified:
+        response_cache.invalidate(FEED)
+    return modified
+
+# Background job refreshing the author snapshots of users whose profile changed
+class AuthorRefresher(BackgroundWorker):
+    name = "author-refresher"
+    description = "Author snapshot refresh"
+
+    def __init__(self, db, interval=10.0, batch_size=100):
+        super().__init__(interval)
+        self.db = db
+        self.batch_size = batch_size
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    # Queue a user whose name or picture changed
+    def schedule(self, user_id):
+        with self.lock:
+            self.pending.add(user_id)
+        self.start()
+
+    def flush(self):
+        modified = 0
+        while True:
+            with self.lock:
+                batch = [self.pending.pop() for _ in range(min(self.batch_size, len(self.pending)))]
+            if not batch:
+                return modified
+            users = list(self.db.users.find({"userId": {"$in": batch}}, {"userId": 1, "name": 1, "email": 1, "profilePicture": 1}))
+            modified += refresh_author_snapshots(self.db, users)
+
+def create_user_cache():
+    return UserCache(
+        maxsize=int(os.getenv("USER_CACHE_SIZE", 10000)),
+        ttl=float(os.getenv("USER_CACHE_TTL", 300))
+    )
+
+def create_author_refresher(db):
+    refresher = AuthorRefresher(db, interval=float(os.getenv("AUTHOR_REFRESH_INTERVAL", 10)))
+    atexit.register(refresher.stop)
+    return refresher
+
+# Refresh the snapshots of every user, in batches
+def refresh_all_author_snapshots(db, batch_size=100):
+    batch, modified = [], 0
+    for user in db.users.find({}, {"userId": 1, "name": 1, "email": 1, "profilePicture": 1}):
+        batch.append(user)
+        if len(batch) >= batch_size:
+            modified += refresh_author_snapshots(db, batch)
+            batch = []
+    return modified + refresh_author_snapshots(db, batch)
+
+# Usage: python users.py refresh-authors
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "refresh-authors":
+        print("Usage: python users.py refresh-authors")
+        sys.exit(1)
+
+    from config import db
+    print(f"Updated {refresh_all_author_snapshots(db)} posts and comments")
@@ -0,0 +1,72 @@
+# Libraries
+import atexit, logging, os, threading
+from workers import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+# Write-behind counter for post views: increments are collected in memory and
+# flushed periodically as a single bulk_write instead of one update per read
+class ViewCounter(BackgroundWorker):
+    name = "view-counter"
+    description = "View counter flush"
+
+    def __init__(self, db, interval=5.0, batch_size=500, on_flush=None):
+        super().__init__(interval)
+        self.db = db
+        self.batch_size = batch_size
+        self.on_flush = on_flush  # called with the written increments ({post _id: views})
+        self.pending = {}  # post _id -> views not yet written
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+
+    # Count a view. Never touches the database on the request path
+    def record(self, post_id, count=1):
+        with self.lock:
+            self.pending[post_id] = self.pending.get(post_id, 0) + count
+            full = len(self.pending) >= self.batch_size
+        self.start()
+        if full:
+            self.wake.set()
+
+    # Views counted in this process that are not written yet
+    def pending_views(self, post_id):
+        with self.lock:
+            return self.pending.get(post_id, 0)
+
+    # Write every pending increment in one unordered bulk_write
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+            if not batch:
+                return 0
+            from pymongo import UpdateOne
+            try:
+                self.db.posts.bulk_write(
+                    [UpdateOne({"_id": post_id}, {"$inc": {"views": count}}) for post_id, count in batch.items()],
+                    ordered=False
+                )
+            except Exception:
+                # Put the increments back so the next flush retries them
+                with self.lock:
+                    for post_id, count in batch.items():
+                        self.pending[post_id] = self.pending.get(post_id, 0) + count
+                raise
+            if self.on_flush:
+                # The views are written: a failure here must not put them back
+                try:
+                    self.on_flush(batch)
+                except Exception as e:
+                    logger.exception("View counter callback failed: %s", e)
+            return len(batch)
+
+def create_view_counter(db, on_flush=None):
+    counter = ViewCounter(
+        db,
+        interval=float(os.getenv("VIEW_FLUSH_INTERVAL", 5)),
+        batch_size=int(os.getenv("VIEW_FLUSH_BATCH_SIZE", 500)),
+        on_flush=on_flush
+    )
+    # Flush the remaining views on shutdown
+    atexit.register(counter.stop)
+    return counter
@@ -0,0 +1,51 @@
+# Libraries
+import logging, threading
+
+logger = logging.getLogger(__name__)
+
+# Base of the jobs that write in a background thread (view counts, trending ranks,
+# derived content fields, author snapshots). Requests queue work and call start();
+# the thread runs flush() every `interval` seconds, or right away after wake.set().
+# Subclasses implement flush() and name the thread and the job (for the error log).
+class BackgroundWorker:
+    name = "background-worker"
+    description = "Background job"
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self.start_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    # Write the queued work, returns how much was written
+    def flush(self):
+        raise NotImplementedError
+
+    # Start the thread on first use (so it is created after a fork)
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        with self.start_lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception("%s failed: %s", self.description, e)
+
+    # Stop the thread and write what is left
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+        if self.thread:
+            self.thread.join(timeout=self.interval)
+        self.flush()
@@ -21,6 +21,8 @@ export default function PostDetailPage() {
     const [liked, setLiked] = useState(false)
     const [likeLoading, setLikeLoading] = useState(false)
     const [error, setError] = useState<string | null>(null)
+    const [commentsCursor, setCommentsCursor] = useState<string | null>(null)
+    const [moreCommentsLoading, setMoreCommentsLoading] = useState(false)
 
     const { data: session } = useSession()
     const params = useParams<{ slug: string }>()
@@ -39,7 +41,11 @@ export default function PostDetailPage() {
             try {
                 setLoading(true)
                 const postData = await postService.getPostBySlug(slug)
-                setPost(postData)
+
+                // Comments are loaded separately, one page at a time
+                const commentPage = await commentService.getCommentsByPostId(postData._id)
+                setPost({ ...postData, comments: commentPage.comments })
+                setCommentsCursor(commentPage.pagination.nextCursor)
 
                 // If the user is authenticated, check if they liked the post
                 if (session?.accessToken) {
@@ -77,7 +83,8 @@ export default function PostDetailPage() {
                 if (!prevPost) return null;
                 return {
                     ...prevPost,
-                    comments: [...prevPost.comments, comment]
+                    comments: [...prevPost.comments, comment],
+                    commentCount: (prevPost.commentCount ?? prevPost.comments.length) + 1
                 }
             })
 
@@ -106,7 +113,8 @@ export default function PostDetailPage() {
                 if (!prevPost) return null;
                 return {
                     ...prevPost,
-                    comments: prevPost.comments.filter(comment => comment._id !== commentId)
+                    comments: prevPost.comments.filter(comment => comment._id !== commentId),
+                    commentCount: (prevPost.commentCount ?? prevPost.comments.length) - 1
                 }
             })
         } catch (err) {
@@ -117,6 +125,28 @@ export default function PostDetailPage() {
         }
     }
 
+    const handleLoadMoreComments = async () => {
+        if (!post || !commentsCursor) return;
+
+        try {
+            setMoreCommentsLoading(true)
+            const commentPage = await commentService.getCommentsByPostId(post._id, commentsCursor)
+            setPost(prevPost => {
+                if (!prevPost) return null;
+                return {
+                    ...prevPost,
+                    comments: [...prevPost.comments, ...commentPage.comments]
+                }
+            })
+            setCommentsCursor(commentPage.pagination.nextCursor)
+        } catch (err) {
+            console.error('Error loading comments:', err)
+            alert('Error loading comments')
+        } finally {
+            setMoreCommentsLoading(false)
+        }
+    }
+
     const handleLikeToggle = async () => {
         if (!session || !post) return;
 
@@ -287,7 +317,7 @@ export default function PostDetailPage() {
             <div className="bg-white rounded-lg shadow-md p-6">
                 <h2 className="text-xl font-bold text-gray-800 mb-6 flex items-center">
                     <MessageCircle className="w-5 h-5 mr-2 text-blue-600" />
-                    Comments ({post.comments.length})
+                    Comments ({post.commentCount ?? post.comments.length})
                 </h2>
 
                 {/* Comment form */}
@@ -386,6 +416,19 @@ export default function PostDetailPage() {
                         ))
                     )}
                 </div>
+
+                {/* Load the next page of comments */}
+                {commentsCursor && (
+                    <div className="text-center mt-6">
+                        <button
+                            onClick={handleLoadMoreComments}
+                            disabled={moreCommentsLoading}
+                            className="text-blue-600 hover:text-blue-800 transition disabled:opacity-50"
+                        >
+                            {moreCommentsLoading ? 'Loading...' : 'Load more comments'}
+                        </button>
+                    </div>
+                )}
             </div>
         </div>
     )
@@ -134,7 +134,7 @@ export default function PostsPage() {
                                                 strong: ({ children }) => <span>{children}</span>
                                             }}
                                         >
-                                            {post.content}
+                                            {post.excerpt ?? post.content}
                                         </ReactMarkdown>
                                     </div>
                                 </div>
@@ -150,7 +150,7 @@ export default function PostsPage() {
                                                 strong: ({ children }) => <span>{children}</span>
                                             }}
                                         >
-                                            {post.content}
+                                            {post.excerpt ?? post.content}
                                         </ReactMarkdown>
                                     </div>
                                 </div>
@@ -193,7 +193,7 @@ export default function PostsPage() {
                                         </span>
                                         <span className="flex items-center text-gray-500 text-sm">
                                             <MessageCircle className="w-4 h-4 mr-1" />
-                                            {post.comments?.length || 0}
+                                            {post.commentCount ?? post.comments?.length ?? 0}
                                         </span>
                                     </div>
                                 </div>
@@ -170,7 +170,7 @@ export default function ProfilePage() {
                         </span>
                       )}
                     </span>
-                    <span>{post.comments.length} comments</span>
+                    <span>{post.commentCount ?? post.comments?.length ?? 0} comments</span>
                     <span>{post.views} views</span>
                   </div>
                 </div>
@@ -41,7 +41,7 @@ function SearchContent() {
       try {
         setLoading(true)
         const results = await postService.searchPosts(query)
-        setPosts(results)
+        setPosts(results.posts)
         setError(null)
       } catch (err) {
         console.error('Error searching posts:', err)
@@ -109,7 +109,7 @@ function SearchContent() {
             >
               <div className="p-6 flex-grow">
                 <h2 className="text-xl font-bold text-gray-800 mb-2">{post.title}</h2>
-                <p className="text-gray-600 mb-4 line-clamp-2">{post.content}</p>
+                <p className="text-gray-600 mb-4 line-clamp-2">{post.snippet ?? post.content}</p>
                 
                 <div className="flex flex-wrap gap-4 text-gray-500 text-sm mb-4">
                   <span className="flex items-center">
@@ -126,7 +126,7 @@ function SearchContent() {
                   </span>
                   <span className="flex items-center">
                     <MessageCircle className="w-4 h-4 mr-1" />
-                    {post.comments?.length || 0}
+                    {post.commentCount ?? post.comments?.length ?? 0}
                   </span>
                 </div>
                 
@@ -1,7 +1,7 @@
 // src/services/api.ts
 import axios from 'axios';
 import { getSession } from 'next-auth/react';
-import { Post, Comment, PaginatedResponse, User } from '@/types';
+import { Post, Comment, CommentPage, PaginatedResponse, User, AuthorStats } from '@/types';
 
 // Crear instancia de axios con URL base
 const api = axios.create({
@@ -87,9 +87,22 @@ export const postService = {
 		await api.delete(`/posts/${id}`);
 	},
 
+	// Obtener los posts en tendencia (vistas, likes y comentarios recientes)
+	getTrendingPosts: async (limit = 10): Promise<{ posts: Post[] }> => {
+		const response = await api.get(`/posts/trending?limit=${limit}`);
+		return response.data;
+	},
+
+	// Obtener varios posts en una sola petición (por ids o por slugs), en el orden pedido
+	getPostsBatch: async (keys: { ids?: string[]; slugs?: string[] }): Promise<{ posts: Post[]; missing: string[] }> => {
+		const params = keys.ids ? `ids=${keys.ids.map(encodeURIComponent).join(',')}` : `slugs=${(keys.slugs || []).map(encodeURIComponent).join(',')}`;
+		const response = await api.get(`/posts/batch?${params}`);
+		return response.data;
+	},
+
 	// Búsqueda de posts
-	searchPosts: async (query: string): Promise<Post[]> => {
-		const response = await api.get(`/posts/search?q=${encodeURIComponent(query)}`);
+	searchPosts: async (query: string, page = 1, limit = 10): Promise<PaginatedResponse<Post>> => {
+		const response = await api.get(`/posts/search?q=${encodeURIComponent(query)}&page=${page}&limit=${limit}`);
 		return response.data;
 	},
 
@@ -109,6 +122,12 @@ export const postService = {
 		return response.data.liked;
 	},
 
+	// Verificar qué posts de una página tienen like del usuario
+	checkLikes: async (postIds: string[]): Promise<Record<string, boolean>> => {
+		const response = await api.get(`/posts/likes?ids=${postIds.map(encodeURIComponent).join(',')}`);
+		return response.data.liked;
+	},
+
 	// Obtener mis posts (incluyendo borradores)
 	getMyPosts: async (page = 1, limit = 10, status?: string): Promise<PaginatedResponse<Post>> => {
 		let url = `/users/me/posts?page=${page}&limit=${limit}`;
@@ -121,6 +140,12 @@ export const postService = {
 	getUserPosts: async (userId: string, page = 1, limit = 10): Promise<PaginatedResponse<Post>> => {
 		const response = await api.get(`/users/${userId}/posts?page=${page}&limit=${limit}`);
 		return response.data;
+	},
+
+	// Obtener las estadísticas de un autor (posts por estado, vistas, likes y comentarios)
+	getUserStats: async (userId: string): Promise<AuthorStats> => {
+		const response = await api.get(`/users/${userId}/stats`);
+		return response.data;
 	}
 };
 
@@ -152,8 +177,10 @@ export const pexelsService = {
 // Servicio para comentarios
 export const commentService = {
 	// Obtener comentarios de un post
-	getCommentsByPostId: async (postId: string): Promise<Comment[]> => {
-		const response = await api.get(`/posts/${postId}/comments`);
+	getCommentsByPostId: async (postId: string, cursor?: string): Promise<CommentPage> => {
+		let url = `/posts/${postId}/comments`;
+		if (cursor) url += `?cursor=${encodeURIComponent(cursor)}`;
+		const response = await api.get(url);
 		return response.data;
 	},
 
@@ -28,6 +28,11 @@ export interface Post {
   likes: number;
   comments: Comment[];
   coverImage?: string; // Opcional porque algunos posts podrían no tener imagen
+  excerpt?: string; // Solo en listados (vista resumida)
+  commentCount?: number; // Solo en listados (vista resumida)
+  snippet?: string; // Solo en resultados de búsqueda
+  score?: number; // Relevancia en resultados de búsqueda
+  trendingScore?: number; // Solo en posts en tendencia
 }
 
 export interface User {
@@ -38,6 +43,17 @@ export interface User {
   lastLogin?: string;
 }
 
+export interface AuthorStats {
+  userId: string;
+  posts: {
+    total: number;
+    byStatus: Record<string, number>; // Por ejemplo { published: 12, draft: 3 }
+  };
+  views: number;
+  likes: number;
+  comments: number;
+}
+
 export interface PaginatedResponse<T> {
   posts: T[];
   pagination: {
@@ -45,6 +61,15 @@ export interface PaginatedResponse<T> {
     page: number;
     limit: number;
     totalPages: number;
+    nextCursor: string | null;
+  };
+}
+
+export interface CommentPage {
+  comments: Comment[];
+  pagination: {
+    limit: number;
+    nextCursor: string | null;
   };
 }
 